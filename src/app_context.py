@@ -3,6 +3,7 @@ from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from canvas import Canvas
+    from layers import LayerStack
     from camera import Camera
     from font_table import FontTable
     from color_table import ColorTable
@@ -16,6 +17,7 @@ class AppContext:
     def __init__(
         self,
         canvas: Canvas | None = None,
+        layers: LayerStack | None = None,
         camera: Camera | None = None,
         font_table: FontTable | None = None,
         color_table: ColorTable | None = None,
@@ -25,6 +27,7 @@ class AppContext:
         debugging_tool: DebuggingTool | None = None,
     ):
         self.canves = canvas
+        self.layers = layers
         self.camera = camera
         self.font_table = font_table
         self.color_table = color_table
@@ -0,0 +1,202 @@
+import re
+import numpy as np
+from functools import lru_cache
+from color import Color
+from color_table import ColorTable
+from static import *
+
+# "B3/S23", "B36/S23", Generations "B2/S/C3" and the S/B/C form "23/3", "/2/3"
+BS_RULE = re.compile(r"B(\d*)/S(\d*)(?:/[CG]?(\d+))?", re.IGNORECASE)
+SB_RULE = re.compile(r"(\d*)/(\d*)(?:/(\d+))?")
+# Larger than Life "R5,C0,M1,S34..58,B34..45,NM"
+LTL_RULE = re.compile(
+    r"R(\d+),C(\d+),M([01]),S(\d+)\.\.(\d+),B(\d+)\.\.(\d+),N([MN])", re.IGNORECASE
+)
+
+
+class Rule:
+    """
+    A totalistic cellular automaton rule compiled into lookup tables.
+
+    A cell is born when it is dead and its alive neighbors count is one of births, and an alive cell
+    survives when its count is one of survivals. With more than 2 states a cell that doesn't survive
+    spends states - 2 steps dying before it's dead, dying cells aren't counted as alive neighbors.
+
+    The state of a cell is read from its alpha, alive cells are opaque and dying cells fade out:
+    state s in [1, states) has the alpha 255 * (states - s) // (states - 1) and every other alpha
+    falls into the state of the nearest alpha above it.
+    """
+
+    def __init__(
+        self,
+        births: Iterable[int],
+        survivals: Iterable[int],
+        states: int = 2,
+        radius: int = 1,
+        neighborhood: Literal["M", "N"] = "M",
+        include_center: bool = False,
+    ) -> None:
+        if not 2 <= states <= 255:
+            raise ValueError(f"{states} states are not supported, only 2 to 255")
+
+        self.states = states
+        self.radius = radius
+        self.neighborhood = neighborhood
+        self.include_center = include_center
+
+        # The (row, column) offsets of the cells counted as neighbors
+        self.offsets = tuple(
+            (offsetY, offsetX)
+            for offsetY in range(-radius, radius + 1)
+            for offsetX in range(-radius, radius + 1)
+            if (neighborhood == "M" or abs(offsetY) + abs(offsetX) <= radius)
+            and (include_center or offsetY or offsetX)
+        )
+
+        max_count = len(self.offsets)
+        self.count_dtype = np.uint8 if max_count < 256 else np.uint16
+        self.births = np.zeros(max_count + 1, dtype=bool)
+        self.births[[count for count in births if count <= max_count]] = True
+        self.survivals = np.zeros(max_count + 1, dtype=bool)
+        self.survivals[[count for count in survivals if count <= max_count]] = True
+
+        # The state of every alpha and the alpha of every state
+        alphas = np.arange(256)
+        self.state_of_alpha = np.where(
+            alphas == 0, 0, states - (alphas * (states - 1) + 254) // 255
+        ).astype(np.uint8)
+        self.alpha_of_state = np.array(
+            [0] + [255 * (states - s) // (states - 1) for s in range(1, states)] + [0],
+            dtype=np.uint32,
+        )
+
+    @staticmethod
+    @lru_cache(maxsize=AUTOMATON_RULE_CACHE_SIZE)
+    def compile(rulestring: str) -> "Rule":
+        """The rule of the given rulestring, compiled once per rulestring"""
+
+        rulestring = rulestring.replace(" ", "")
+
+        if match := LTL_RULE.fullmatch(rulestring):
+            radius, states, center, s_min, s_max, b_min, b_max, neighborhood = (
+                match.groups()
+            )
+            return Rule(
+                range(int(b_min), int(b_max) + 1),
+                range(int(s_min), int(s_max) + 1),
+                max(int(states), 2),
+                int(radius),
+                neighborhood.upper(),
+                center == "1",
+            )
+
+        if match := BS_RULE.fullmatch(rulestring):
+            births, survivals, states = match.groups()
+        elif match := SB_RULE.fullmatch(rulestring):
+            survivals, births, states = match.groups()
+        else:
+            raise ValueError(f"{rulestring!r} is not a valid rule")
+
+        return Rule(map(int, births), map(int, survivals), int(states or 2))
+
+    def count_neighbors(self, alive: np.ndarray) -> np.ndarray:
+        """The alive neighbors count of the given cells without their radius wide border"""
+
+        r = self.radius
+        h, w = alive.shape[0] - 2 * r, alive.shape[1] - 2 * r
+        alive = alive.astype(self.count_dtype)
+
+        if self.neighborhood == "M":
+            # The square is summed as a row sum followed by a column sum
+            rows = Rule.box_sum(alive, r, 1)
+            counts = Rule.box_sum(rows, r, 0)
+        else:
+            # The diamond is summed row by row, each row is narrower the further it is from the center
+            counts = np.zeros((h, w), dtype=self.count_dtype)
+            for offsetY in range(-r, r + 1):
+                half_width = r - abs(offsetY)
+                rows = alive[r + offsetY : r + offsetY + h, r - half_width :]
+                counts += Rule.box_sum(rows, half_width, 1)[:, :w]
+
+        if not self.include_center:
+            counts -= alive[r : r + h, r : r + w]
+
+        return counts
+
+    @staticmethod
+    def box_sum(values: np.ndarray, radius: int, axis: int) -> np.ndarray:
+        """The sums of every 2 * radius + 1 values along the axis, the result is 2 * radius shorter"""
+
+        length = values.shape[axis] - 2 * radius
+
+        def window(start: int) -> tuple[slice, ...]:
+            return (slice(None),) * axis + (slice(start, start + length),)
+
+        if radius <= 1:
+            sums = values[window(0)].copy()
+            for offset in range(1, 2 * radius + 1):
+                sums += values[window(offset)]
+            return sums
+
+        # Longer sums are the differences of the running sum
+        running = np.cumsum(values, axis=axis, dtype=np.int32)
+        running = np.concatenate(
+            (np.zeros_like(running.take([0], axis=axis)), running), axis=axis
+        )
+        sums = running[window(2 * radius + 1)] - running[window(0)]
+        return sums.astype(values.dtype)
+
+    def step(self, pixels: np.ndarray) -> np.ndarray:
+        """The next generation of the given pixels without their radius wide border"""
+
+        r = self.radius
+        h, w = pixels.shape[0] - 2 * r, pixels.shape[1] - 2 * r
+        inside = pixels[r : r + h, r : r + w]
+
+        if self.states == 2:
+            states = (pixels != Color.NULL_VALUE).view(np.uint8)
+        else:
+            states = self.state_of_alpha[pixels & 0xFF]
+        alive = states == 1
+        counts = self.count_neighbors(alive)
+        states_inside = states[r : r + h, r : r + w]
+
+        survivors = (states_inside == 1) & self.survivals[counts]
+        births = (states_inside == 0) & self.births[counts]
+        next_generation_pixels = np.where(survivors, inside, Color.NULL_VALUE).astype(
+            np.uint32
+        )
+
+        # The cells that didn't survive start dying and the dying ones keep fading out
+        if self.states > 2:
+            dying = (states_inside >= 2) | ((states_inside == 1) & ~survivors)
+            next_states = np.maximum(states_inside[dying], 1) + 1
+            next_generation_pixels[dying] = (inside[dying] & 0xFFFFFF00) | (
+                self.alpha_of_state[next_states]
+            )
+            next_generation_pixels[dying & (states_inside == self.states - 1)] = (
+                Color.NULL_VALUE
+            )
+
+        # A new cell gets the average color of its alive neighbors, gathered only around the new cells.
+        # The channels are summed as the bytes of the packed colors so the average keeps their order
+        births = np.flatnonzero(births)
+        if not births.size:
+            return next_generation_pixels
+
+        flat_pixels = np.ascontiguousarray(pixels).ravel()
+        flat_alive = alive.ravel()
+        centers = births + (births // w) * 2 * r + r * (w + 2 * r) + r
+        new_cells_colors = np.zeros((births.size, 4), dtype=np.uint32)
+        for offsetY, offsetX in self.offsets:
+            neighbors = centers + offsetY * (w + 2 * r) + offsetX
+            colors = np.where(flat_alive[neighbors], flat_pixels[neighbors], 0)
+            new_cells_colors += colors.view(np.uint8).reshape(-1, 4)
+
+        new_cells_colors //= np.maximum(counts.ravel()[births], 1)[:, None]
+        new_cells_colors = new_cells_colors.astype(np.uint8).view(np.uint32).ravel()
+        next_generation_pixels.ravel()[births] = np.where(
+            new_cells_colors == Color.NULL_VALUE, ColorTable.WHITE, new_cells_colors
+        )
+
+        return next_generation_pixels
@@ -1,3 +1,4 @@
+import numpy as np
 from canvas import Canvas
 from vector import Vector
 from static import *
@@ -43,29 +44,71 @@ class Camera:
 
         return Vector(x, y)
 
+    def to_local_many(self, positions: np.ndarray) -> np.ndarray:
+        """Translate an array of shape (N, 2) of window positions to pixels coordinates in the canves"""
+
+        origin = np.array(
+            (
+                self.canves.rect.left + self.offset.x,
+                self.canves.rect.top + self.offset.y,
+            )
+        )
+
+        return np.floor_divide(
+            np.asarray(positions) - origin, self.cell_size * self.zoom
+        ).astype(np.int64)
+
     def to_world(self, pos: Vector, anchor: Anchor = "c") -> Vector:
         """Translate the given pixel position to coordinates relative to the window"""
 
-        world_pos = Vector(*pos)
+        anchor_x, anchor_y = self.anchor_offset(anchor)
+
+        # ---------- Translating the space ----------
+        x = int((pos[0] + anchor_x) * self.cell_size * self.zoom + self.offset.x)
+        y = int((pos[1] + anchor_y) * self.cell_size * self.zoom + self.offset.y)
+
+        return Vector(x, y)
+
+    def to_world_many(self, positions: np.ndarray, anchor: Anchor = "c") -> np.ndarray:
+        """Translate an array of shape (N, 2) of pixels positions to coordinates relative to the window"""
+
+        world_pos = np.asarray(positions) + self.anchor_offset(anchor)
+        world_pos = world_pos * self.cell_size * self.zoom + self.offset.xy
+
+        return np.floor(world_pos).astype(np.int64)
+
+    def visible_cells(self, size: WH = WINDOW_SIZE) -> tuple[int, int, int, int]:
+        """The (left, top, right, bottom) pixels of the canves that are visible in a window of the given size, right and bottom are exclusive"""
+
+        (left, top), (right, bottom) = self.to_local_many(((0, 0), size))
+
+        left = min(max(left, 0), self.canves.w)
+        top = min(max(top, 0), self.canves.h)
+        right = min(max(right + 1, 0), self.canves.w)
+        bottom = min(max(bottom + 1, 0), self.canves.h)
+
+        return left, top, right, bottom
+
+    @staticmethod
+    def anchor_offset(anchor: Anchor) -> tuple[float, float]:
+        """The offset of the anchor relative to the topleft of the cell in cells"""
+
+        x, y = 0, 0
 
         # ---------- Handling the anchor ----------
         # Adding half of the cell size to one of the access
         # Scine if the anchor is one letter that means one of the (x, y) will be half the cell as a default
         if len(anchor) == 1:
             if anchor in {"n", "s", "c"}:
-                world_pos.x += 0.5
+                x += 0.5
             if anchor in {"e", "w", "c"}:
-                world_pos.y += 0.5
+                y += 0.5
         else:
             # I "n" in anchor the y value will be 0 (relative to the topleft of the cell) by default
             if "e" in anchor:
-                world_pos.x += 1
+                x += 1
             if "s" in anchor:
-                world_pos.y += 1
+                y += 1
             # If "w" in anchor the x value will be 0 (relative to the topleft of the cell) by default
 
-        # ---------- Translating the space ----------
-        world_pos.x = int(world_pos.x * self.cell_size * self.zoom + self.offset.x)
-        world_pos.y = int(world_pos.y * self.cell_size * self.zoom + self.offset.y)
-
-        return world_pos
+        return x, y
@@ -1,29 +1,80 @@
+import os
 import pygame
 import numpy as np
+from collections import OrderedDict
+from typing import Iterator, Iterable, Callable
 from vector import Vector
 from color import Color
 from static import *
 
 
 class Canvas:
-    def __init__(self, size: WH = WINDOW_SIZE) -> None:
+    def __init__(self, size: WH = WINDOW_SIZE, path: str | None = None) -> None:
         self.surf = pygame.Surface(WINDOW_SIZE)
         self.rect = self.surf.get_rect()
-        self.pixels: np.ndarray = np.zeros(size[::-1], dtype=np.int64)
+
+        self.allocate(size, path)
+
+        # The rendered tiles, only the dirty ones get re-rendered and the least recently used are dropped
+        self.tile_surfs: OrderedDict[tuple[int, int], pygame.Surface] = OrderedDict()
+        self.dirty: set[tuple[int, int]] = set()
+
+        # Called with the canves and the tiles about to be written to, before the write happens
+        self.write_hooks: list[Callable[["Canvas", set[tuple[int, int]]], None]] = []
+
+    def allocate(self, size: WH, path: str | None) -> None:
+        """Creates the pixels buffer of the given size, memory mapped to the file at path if there is one"""
+
+        if path is None:
+            self.pixels: np.ndarray = np.zeros(size[::-1], dtype=np.uint32)
+        else:
+            # Memory mapping the file so the OS pages in only the pixels that get touched,
+            # an existing file keeps its pixels while a new one starts transparent
+            mode = "r+" if os.path.exists(path) else "w+"
+            if mode == "r+" and os.path.getsize(path) != size[0] * size[1] * 4:
+                raise ValueError(
+                    f"{path!r} holds {os.path.getsize(path)} bytes while a {size[0]}x{size[1]} canves takes {size[0] * size[1] * 4}"
+                )
+
+            self.pixels: np.ndarray = np.memmap(
+                path, dtype=np.uint32, mode=mode, shape=size[::-1]
+            )
 
     @property
     def w(self) -> int:
-        return self.pixels.shape[0]
+        return self.pixels.shape[1]
 
     @property
     def h(self) -> int:
-        return self.pixels.shape[1]
+        return self.pixels.shape[0]
+
+    @property
+    def channels(self) -> np.ndarray:
+        """A (h, w, 4) view of the pixels bytes, the order of the channels follows Color.CHANNEL_BYTES"""
+
+        return self.pixels.view(np.uint8).reshape(self.h, self.w, 4)
+
+    @property
+    def r(self) -> np.ndarray:
+        return self.channels[..., Color.CHANNEL_BYTES[0]]
+
+    @property
+    def g(self) -> np.ndarray:
+        return self.channels[..., Color.CHANNEL_BYTES[1]]
+
+    @property
+    def b(self) -> np.ndarray:
+        return self.channels[..., Color.CHANNEL_BYTES[2]]
+
+    @property
+    def a(self) -> np.ndarray:
+        return self.channels[..., Color.CHANNEL_BYTES[3]]
 
     def is_inside(self, pos: Vector) -> bool:
         return 0 <= pos[0] < self.w and 0 <= pos[1] < self.h
 
-    def get_at(self, pos: XY) -> RGBA:
-        return self.pixels[pos[1]][pos[0]]
+    def get_at(self, pos: XY) -> int:
+        return int(self.pixels[pos[1], pos[0]])
 
     def set_at(self, pos: XY, color: RGBA) -> None:
         """Change the color of the pixel with given position to the given color"""
@@ -33,9 +84,495 @@ class Canvas:
             return
 
         col, row = pos
+        self.touch(((col // CANVAS_TILE_SIZE, row // CANVAS_TILE_SIZE),))
         self.pixels[row, col] = Color.tuple_to_int(color)
 
+    @staticmethod
+    def pack(color: RGBA | np.ndarray) -> int | np.ndarray:
+        """A color as a 0xRRGGBBAA integer, arrays are taken as already packed colors"""
+
+        if isinstance(color, np.ndarray):
+            return color.astype(np.uint32, copy=False)
+
+        return Color.tuple_to_int(color)
+
+    def clip_points(
+        self, xs: np.ndarray, ys: np.ndarray, color: RGBA | np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, int | np.ndarray]:
+        """Drops the points outside the canves along with their colors if there is a color for each point"""
+
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        values = Canvas.pack(color)
+
+        inside = (xs >= 0) & (xs < self.w) & (ys >= 0) & (ys < self.h)
+        if np.ndim(values):
+            values = values[inside]
+
+        return xs[inside], ys[inside], values
+
+    def get_many(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """The packed colors of the pixels at the given coordinates, which have to be inside the canves"""
+
+        return self.pixels[ys, xs]
+
+    def set_many(
+        self, xs: np.ndarray, ys: np.ndarray, color: RGBA | np.ndarray
+    ) -> None:
+        """Change the color of the pixels at the given coordinates, the color is either one color or an array of packed colors for each pixel"""
+
+        xs, ys, values = self.clip_points(xs, ys, color)
+        if not xs.size:
+            return
+
+        self.mark_dirty_points(xs, ys)
+        self.pixels[ys, xs] = values
+
+    def set_span(self, y: int, left: int, right: int, color: RGBA) -> None:
+        """Change the color of a horizontal run of pixels, right is exclusive"""
+
+        self.set_rect(left, y, right, y + 1, color)
+
+    def set_rect(
+        self, left: int, top: int, right: int, bottom: int, color: RGBA | np.ndarray
+    ) -> None:
+        """Change the color of the pixels inside the rectangle, right and bottom are exclusive.
+
+        The color is either one color or an array of packed colors with the rectangle shape.
+        """
+
+        values = Canvas.pack(color)
+
+        # clipping the rectangle and the colors array along with it
+        x0, x1 = max(left, 0), min(right, self.w)
+        y0, y1 = max(top, 0), min(bottom, self.h)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        if np.ndim(values):
+            values = values[y0 - top : y1 - top, x0 - left : x1 - left]
+
+        self.mark_dirty(x0, y0, x1, y1)
+        self.pixels[y0:y1, x0:x1] = values
+
+    def region(
+        self, left: int, top: int, right: int, bottom: int, step: int = 1
+    ) -> np.ndarray:
+        """The pixels inside the given rectangle taking every step-th pixel, right and bottom are exclusive"""
+
+        return self.pixels[top:bottom:step, left:right:step]
+
+    def painted(self) -> tuple[np.ndarray, np.ndarray]:
+        """The (xs, ys) of the pixels that aren't transparent"""
+
+        ys, xs = np.nonzero(self.pixels)
+
+        return xs, ys
+
+    def set_pixels(self, pixels: np.ndarray) -> None:
+        """Replace all of the pixels, only the tiles that changed are marked as dirty"""
+
+        self.mark_dirty_mask(pixels != self.pixels)
+        self.pixels[:] = pixels
+
     def reset_pixels(self) -> None:
         """Resets all of the pixels colors to 0x00000000"""
 
-        self.pixels: np.ndarray = np.zeros((self.h, self.w), dtype=np.int64)
+        self.mark_dirty(0, 0, self.w, self.h)
+        self.pixels.fill(Color.NULL_VALUE)
+
+    def flush(self) -> None:
+        """Write the changed pixels of a memory mapped canves back to its file"""
+
+        if isinstance(self.pixels, np.memmap):
+            self.pixels.flush()
+
+    def tile_rect(self, tile: XY) -> tuple[int, int, int, int]:
+        """The (left, top, right, bottom) pixels covered by the tile, right and bottom are exclusive"""
+
+        left = tile[0] * CANVAS_TILE_SIZE
+        top = tile[1] * CANVAS_TILE_SIZE
+
+        return (
+            left,
+            top,
+            min(left + CANVAS_TILE_SIZE, self.w),
+            min(top + CANVAS_TILE_SIZE, self.h),
+        )
+
+    def tiles_in(
+        self, left: int, top: int, right: int, bottom: int
+    ) -> Iterator[tuple[int, int]]:
+        """The tiles overlapping the given pixels rectangle, right and bottom are exclusive"""
+
+        left, right = max(left, 0), min(right, self.w)
+        top, bottom = max(top, 0), min(bottom, self.h)
+        if left >= right or top >= bottom:
+            return
+
+        for ty in range(top // CANVAS_TILE_SIZE, (bottom - 1) // CANVAS_TILE_SIZE + 1):
+            for tx in range(
+                left // CANVAS_TILE_SIZE, (right - 1) // CANVAS_TILE_SIZE + 1
+            ):
+                yield tx, ty
+
+    def touch(self, tiles: Iterable[tuple[int, int]]) -> None:
+        """Mark the tiles as dirty, every write goes through here before changing the pixels"""
+
+        tiles = set(tiles)
+        for hook in self.write_hooks:
+            hook(self, tiles)
+
+        self.dirty.update(tiles)
+
+    def mark_dirty(self, left: int, top: int, right: int, bottom: int) -> None:
+        """Mark the tiles overlapping the given pixels rectangle as dirty, right and bottom are exclusive"""
+
+        self.touch(self.tiles_in(left, top, right, bottom))
+
+    def mark_dirty_points(self, xs: np.ndarray, ys: np.ndarray) -> None:
+        """Mark the tiles holding the given pixels coordinates as dirty"""
+
+        cols = -(-self.w // CANVAS_TILE_SIZE)
+        keys = np.unique((ys // CANVAS_TILE_SIZE) * cols + xs // CANVAS_TILE_SIZE)
+
+        self.touch((int(tx), int(ty)) for ty, tx in zip(*np.divmod(keys, cols)))
+
+    def mark_dirty_mask(self, mask: np.ndarray) -> None:
+        """Mark the tiles that has any True value in the given mask of the canves shape as dirty"""
+
+        # padding the mask to a whole number of tiles so it could be folded into (rows, tile, cols, tile)
+        rows = -(-self.h // CANVAS_TILE_SIZE)
+        cols = -(-self.w // CANVAS_TILE_SIZE)
+        padded = np.zeros(
+            (rows * CANVAS_TILE_SIZE, cols * CANVAS_TILE_SIZE), dtype=bool
+        )
+        padded[: self.h, : self.w] = mask
+
+        tiles = padded.reshape(rows, CANVAS_TILE_SIZE, cols, CANVAS_TILE_SIZE).any(
+            axis=(1, 3)
+        )
+        self.touch((int(tx), int(ty)) for ty, tx in zip(*np.nonzero(tiles)))
+
+    def tile_groups(
+        self, xs: np.ndarray, ys: np.ndarray
+    ) -> Iterator[tuple[tuple[int, int], np.ndarray, np.ndarray, np.ndarray]]:
+        """The (tile, local ys, local xs, points) of every tile holding any of the pixels, points index the given pixels"""
+
+        if not xs.size:
+            return
+
+        size = CANVAS_TILE_SIZE
+        cols = -(-self.w // size)
+        keys = (ys // size) * cols + xs // size
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], keys.size]
+
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            ty, tx = divmod(int(keys[start]), cols)
+            points = order[start:end]
+
+            yield (tx, ty), ys[points] % size, xs[points] % size, points
+
+    @staticmethod
+    def blit_pixels(surf: pygame.Surface, pixels: np.ndarray) -> None:
+        """Copy the pixels to the topleft of a SRCALPHA surface, transparent pixels are left transparent"""
+
+        channels = Color.ints_to_array(pixels).swapaxes(0, 1)
+        w, h = channels.shape[:2]
+
+        # surfarray views are indexed (x, y) and keep the surface locked while they exist
+        rgb = pygame.surfarray.pixels3d(surf)
+        alpha = pygame.surfarray.pixels_alpha(surf)
+        rgb[:w, :h] = channels[..., :3]
+        alpha[:w, :h] = np.where(channels[..., 3] != 0, 0xFF, 0)
+        del rgb, alpha
+
+    def tile_surface(self, tile: XY) -> pygame.Surface | None:
+        """The rendered tile, it gets re-rendered only if it's dirty or not in the cache"""
+
+        surf = self.tile_surfs.get(tile)
+
+        if surf is None or tile in self.dirty:
+            left, top, right, bottom = self.tile_rect(tile)
+            if surf is None:
+                surf = pygame.Surface((right - left, bottom - top), pygame.SRCALPHA)
+
+            Canvas.blit_pixels(surf, self.region(left, top, right, bottom))
+            self.tile_surfs[tile] = surf
+            self.dirty.discard(tile)
+
+            if len(self.tile_surfs) > TILE_SURFACE_CACHE_SIZE:
+                self.tile_surfs.popitem(last=False)
+
+        self.tile_surfs.move_to_end(tile)
+
+        return surf
+
+    def view(
+        self, left: int, top: int, right: int, bottom: int, step: int = 1
+    ) -> pygame.Surface:
+        """Renders the given pixels rectangle with one surface pixel for every step-th pixel, right and bottom are exclusive"""
+
+        # When zoomed out far enough to skip pixels the rectangle is sampled directly,
+        # so the cost stays bounded by the window size instead of the tiles count
+        if step > 1:
+            pixels = self.region(left, top, right, bottom, step)
+            surf = pygame.Surface(pixels.shape[::-1], pygame.SRCALPHA)
+            Canvas.blit_pixels(surf, pixels)
+            return surf
+
+        surf = pygame.Surface((right - left, bottom - top), pygame.SRCALPHA)
+
+        for tile in self.tiles_in(left, top, right, bottom):
+            tile_surf = self.tile_surface(tile)
+            if tile_surf is not None:
+                tile_left, tile_top = self.tile_rect(tile)[:2]
+                surf.blit(tile_surf, (tile_left - left, tile_top - top))
+
+        return surf
+
+
+class TiledCanvas(Canvas):
+    """
+    A canves that keeps its pixels in CANVAS_TILE_SIZE tiles allocated on their first write.
+
+    The memory scales with the painted area instead of the canves size, while the get_at, set_at, region,
+    set_pixels and reset_pixels interface stays the same so drawing and effects keep working.
+    The channels are a copy since there is no single pixels buffer to view.
+    """
+
+    def __init__(self, size: WH = WINDOW_SIZE) -> None:
+        super().__init__(size)
+
+    def allocate(self, size: WH, path: str | None) -> None:
+        """Only keeps the size, the tiles are allocated on their first write"""
+
+        self.size = size
+        self.tiles: dict[tuple[int, int], np.ndarray] = {}
+
+    @property
+    def w(self) -> int:
+        return self.size[0]
+
+    @property
+    def h(self) -> int:
+        return self.size[1]
+
+    @property
+    def channels(self) -> np.ndarray:
+        """A (h, w, 4) copy of the pixels bytes, the order of the channels follows Color.CHANNEL_BYTES"""
+
+        pixels = self.region(0, 0, self.w, self.h)
+
+        return pixels.view(np.uint8).reshape(self.h, self.w, 4)
+
+    def get_at(self, pos: XY) -> int:
+        col, row = pos
+        tile = self.tiles.get((col // CANVAS_TILE_SIZE, row // CANVAS_TILE_SIZE))
+        if tile is None:
+            return Color.NULL_VALUE
+
+        return int(tile[row % CANVAS_TILE_SIZE, col % CANVAS_TILE_SIZE])
+
+    def set_at(self, pos: XY, color: RGBA) -> None:
+        """Change the color of the pixel with given position to the given color"""
+
+        if not self.is_inside(pos):
+            return
+
+        col, row = pos
+        key = (col // CANVAS_TILE_SIZE, row // CANVAS_TILE_SIZE)
+        value = Color.tuple_to_int(color)
+
+        tile = self.tiles.get(key)
+        # Erasing a pixel that was never painted
+        if tile is None and value == Color.NULL_VALUE:
+            return
+
+        self.touch((key,))
+        if tile is None:
+            tile = self.tiles[key] = self.new_tile()
+
+        tile[row % CANVAS_TILE_SIZE, col % CANVAS_TILE_SIZE] = value
+
+    def get_many(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """The packed colors of the pixels at the given coordinates, which have to be inside the canves"""
+
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        if not xs.size:
+            return np.empty(0, dtype=np.uint32)
+
+        values = np.zeros(xs.size, dtype=np.uint32)
+
+        # each tile is read at once, the tiles never painted are left transparent
+        for key, tile_ys, tile_xs, points in self.tile_groups(xs, ys):
+            tile = self.tiles.get(key)
+            if tile is not None:
+                values[points] = tile[tile_ys, tile_xs]
+
+        return values
+
+    def set_many(
+        self, xs: np.ndarray, ys: np.ndarray, color: RGBA | np.ndarray
+    ) -> None:
+        """Change the color of the pixels at the given coordinates, the color is either one color or an array of packed colors for each pixel"""
+
+        xs, ys, values = self.clip_points(xs, ys, color)
+        if not xs.size:
+            return
+
+        # each tile is written at once
+        for key, tile_ys, tile_xs, points in self.tile_groups(xs, ys):
+            tile_values = values[points] if np.ndim(values) else values
+
+            tile = self.tiles.get(key)
+            if tile is None and not np.any(tile_values):
+                continue
+
+            self.touch((key,))
+            if tile is None:
+                tile = self.tiles[key] = self.new_tile()
+
+            tile[tile_ys, tile_xs] = tile_values
+
+    def set_rect(
+        self, left: int, top: int, right: int, bottom: int, color: RGBA | np.ndarray
+    ) -> None:
+        """Change the color of the pixels inside the rectangle, right and bottom are exclusive.
+
+        The color is either one color or an array of packed colors with the rectangle shape.
+        """
+
+        values = Canvas.pack(color)
+
+        for tile in self.tiles_in(left, top, right, bottom):
+            tile_left, tile_top, tile_right, tile_bottom = self.tile_rect(tile)
+            x0, x1 = max(left, tile_left), min(right, tile_right)
+            y0, y1 = max(top, tile_top), min(bottom, tile_bottom)
+
+            block = values
+            if np.ndim(values):
+                block = values[y0 - top : y1 - top, x0 - left : x1 - left]
+
+            if tile not in self.tiles and not np.any(block):
+                continue
+
+            self.touch((tile,))
+            if tile not in self.tiles:
+                self.tiles[tile] = self.new_tile()
+
+            self.tiles[tile][
+                y0 - tile_top : y1 - tile_top, x0 - tile_left : x1 - tile_left
+            ] = block
+
+    @staticmethod
+    def new_tile() -> np.ndarray:
+        return np.zeros((CANVAS_TILE_SIZE, CANVAS_TILE_SIZE), dtype=np.uint32)
+
+    def allocated_tiles_in(
+        self, left: int, top: int, right: int, bottom: int
+    ) -> Iterator[tuple[int, int]]:
+        """The allocated tiles overlapping the given pixels rectangle, right and bottom are exclusive"""
+
+        left, right = max(left, 0), min(right, self.w)
+        top, bottom = max(top, 0), min(bottom, self.h)
+        if left >= right or top >= bottom:
+            return
+
+        tiles_x = range(left // CANVAS_TILE_SIZE, (right - 1) // CANVAS_TILE_SIZE + 1)
+        tiles_y = range(top // CANVAS_TILE_SIZE, (bottom - 1) // CANVAS_TILE_SIZE + 1)
+
+        # Going through whichever is smaller, the allocated tiles or the tiles of the rectangle
+        if len(self.tiles) < len(tiles_x) * len(tiles_y):
+            for tx, ty in list(self.tiles):
+                if tx in tiles_x and ty in tiles_y:
+                    yield tx, ty
+        else:
+            for ty in tiles_y:
+                for tx in tiles_x:
+                    if (tx, ty) in self.tiles:
+                        yield tx, ty
+
+    def region(
+        self, left: int, top: int, right: int, bottom: int, step: int = 1
+    ) -> np.ndarray:
+        """A copy of the pixels inside the given rectangle taking every step-th pixel, right and bottom are exclusive"""
+
+        pixels = np.zeros(
+            (len(range(top, bottom, step)), len(range(left, right, step))),
+            dtype=np.uint32,
+        )
+
+        for tile in self.allocated_tiles_in(left, top, right, bottom):
+            tile_left, tile_top, tile_right, tile_bottom = self.tile_rect(tile)
+
+            # the first sampled pixel inside the tile on each axis
+            x0 = left + -(-(max(tile_left, left) - left) // step) * step
+            y0 = top + -(-(max(tile_top, top) - top) // step) * step
+            x1 = min(tile_right, right)
+            y1 = min(tile_bottom, bottom)
+            if x0 >= x1 or y0 >= y1:
+                continue
+
+            block = self.tiles[tile][
+                y0 - tile_top : y1 - tile_top : step,
+                x0 - tile_left : x1 - tile_left : step,
+            ]
+            col = (x0 - left) // step
+            row = (y0 - top) // step
+            pixels[row : row + block.shape[0], col : col + block.shape[1]] = block
+
+        return pixels
+
+    def painted(self) -> tuple[np.ndarray, np.ndarray]:
+        """The (xs, ys) of the pixels that aren't transparent"""
+
+        xs, ys = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+        for tile, pixels in self.tiles.items():
+            left, top, right, bottom = self.tile_rect(tile)
+            tile_ys, tile_xs = np.nonzero(pixels[: bottom - top, : right - left])
+            xs.append(tile_xs + left)
+            ys.append(tile_ys + top)
+
+        return np.concatenate(xs), np.concatenate(ys)
+
+    def set_pixels(self, pixels: np.ndarray) -> None:
+        """Replace all of the pixels, tiles left empty are freed"""
+
+        self.mark_dirty_mask(pixels != self.region(0, 0, self.w, self.h))
+
+        for tile in self.tiles_in(0, 0, self.w, self.h):
+            left, top, right, bottom = self.tile_rect(tile)
+            block = pixels[top:bottom, left:right]
+
+            if not block.any():
+                self.tiles.pop(tile, None)
+                continue
+
+            if tile not in self.tiles:
+                self.tiles[tile] = self.new_tile()
+            self.tiles[tile][: bottom - top, : right - left] = block
+
+    def reset_pixels(self) -> None:
+        """Resets all of the pixels colors to 0x00000000 by freeing all of the tiles"""
+
+        self.touch(self.tiles)
+        self.tiles.clear()
+
+    def flush(self) -> None:
+        """The tiles live in memory only, there is no file to write back to"""
+
+    def tile_surface(self, tile: XY) -> pygame.Surface | None:
+        """The rendered tile, None if the tile was never painted"""
+
+        if tile not in self.tiles:
+            self.tile_surfs.pop(tile, None)
+            self.dirty.discard(tile)
+            return None
+
+        return super().tile_surface(tile)
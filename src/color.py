@@ -1,3 +1,4 @@
+import sys
 import numpy as np
 from typing import Generator, Literal, Callable
 from static import *
@@ -33,6 +34,8 @@ class Color:
     B_UNMASK = R_MASK | G_MASK | A_MASK
     A_UNMASK = R_MASK | G_MASK | B_MASK
     NULL_VALUE = 0x00000000
+    # The index of the red, green, blue and alpha bytes inside a uint32 0xRRGGBBAA in memory
+    CHANNEL_BYTES = (3, 2, 1, 0) if sys.byteorder == "little" else (0, 1, 2, 3)
 
     @staticmethod
     def tuple_to_int(rgba: RGBA) -> int:
@@ -58,6 +61,92 @@ class Color:
 
         return (r, g, b, a)
 
+    @staticmethod
+    def ints_to_array(values: np.ndarray) -> np.ndarray:
+        """Unpack an array of 0xRRGGBBAA integers to an array of shape (..., 4) holding the red, green, blue and alpha channels"""
+
+        values = np.ascontiguousarray(values, dtype=np.uint32)
+        channels = values.view(np.uint8).reshape(values.shape + (4,))
+
+        return channels[..., Color.CHANNEL_BYTES]
+
+    @staticmethod
+    def array_to_ints(channels: np.ndarray) -> np.ndarray:
+        """Pack an array of shape (..., 4) holding the red, green, blue and alpha channels to an array of 0xRRGGBBAA integers"""
+
+        channels = np.asarray(channels, dtype=np.uint32)
+
+        return (
+            (channels[..., 0] & 0xFF) << 24
+            | (channels[..., 1] & 0xFF) << 16
+            | (channels[..., 2] & 0xFF) << 8
+            | (channels[..., 3] & 0xFF)
+        )
+
+    @staticmethod
+    def premultiply(values: np.ndarray) -> np.ndarray:
+        """The float32 (..., 4) channels in [0, 1] of the 0xRRGGBBAA integers with the color multiplied by the alpha"""
+
+        channels = Color.ints_to_array(values).astype(np.float32) / 0xFF
+        channels[..., :3] *= channels[..., 3:]
+
+        return channels
+
+    @staticmethod
+    def unpremultiply(channels: np.ndarray) -> np.ndarray:
+        """The 0xRRGGBBAA integers of the premultiplied float channels in [0, 1]"""
+
+        color, alpha = channels[..., :3], channels[..., 3:]
+        color = np.divide(color, alpha, out=np.zeros_like(color), where=alpha > 0)
+
+        return Color.array_to_ints(np.rint(np.concatenate((color, alpha), -1) * 0xFF))
+
+    @staticmethod
+    def over(
+        bottom: np.ndarray,
+        top: np.ndarray,
+        opacity: float = 1.0,
+        mode: BlendMode = "normal",
+    ) -> np.ndarray:
+        """Composite the top colors over the bottom colors, both are arrays of 0xRRGGBBAA integers with the same shape"""
+
+        channels = Color.over_premultiplied(
+            Color.premultiply(bottom), Color.premultiply(top), opacity, mode
+        )
+
+        return Color.unpremultiply(channels)
+
+    @staticmethod
+    def over_premultiplied(
+        bottom: np.ndarray,
+        top: np.ndarray,
+        opacity: float = 1.0,
+        mode: BlendMode = "normal",
+    ) -> np.ndarray:
+        """Composite the top premultiplied channels over the bottom ones, both are float (..., 4) arrays in [0, 1]"""
+
+        top = top * opacity
+        cb, ab = bottom[..., :3], bottom[..., 3:]
+        cs, as_ = top[..., :3], top[..., 3:]
+
+        # The color where both of the layers are covering each other, weighted by both of the alphas
+        match mode:
+            case "normal":
+                mixed = cs * ab
+            case "multiply":
+                mixed = cs * cb
+            case "screen":
+                mixed = cs * ab + cb * as_ - cs * cb
+            case "add":
+                mixed = np.minimum(cs * ab + cb * as_, as_ * ab)
+            case _:
+                raise ValueError(f"unknown blend mode {mode!r}")
+
+        color = cs * (1 - ab) + mixed + cb * (1 - as_)
+        alpha = as_ + ab * (1 - as_)
+
+        return np.concatenate((color, alpha), -1)
+
     def __init__(self, value: np.int32) -> None:
         self.value = value
 
@@ -1,3 +1,7 @@
+import pygame
+import numpy as np
+from math import comb
+from functools import lru_cache
 from canvas import Canvas
 from camera import Camera
 from vector import Vector
@@ -5,235 +9,476 @@ from color import Color
 from color_table import ColorTable
 from static import *
 
+# The (x, y) of the eighth k of a turn is (a * x + b * y, c * x + d * y) of the circle octant,
+# for a row (a, b, c, d) of the eighths going counterclockwise from the right of the center
+OCTANT_MIRRORS = np.array(
+    (
+        (0, -1, -1, 0),
+        (1, 0, 0, 1),
+        (-1, 0, 0, 1),
+        (0, 1, -1, 0),
+        (0, 1, 1, 0),
+        (-1, 0, 0, -1),
+        (1, 0, 0, -1),
+        (0, -1, 1, 0),
+    ),
+    dtype=np.int64,
+)
+
+
+class Coverage:
+    """How much of every pixel the Anti-Aliased primitives drawn into it cover, in [0, 1]."""
+
+    def __init__(self) -> None:
+        self.xs: list[np.ndarray] = []
+        self.ys: list[np.ndarray] = []
+        self.values: list[np.ndarray] = []
+
+    def add(self, xs: np.ndarray, ys: np.ndarray, values: np.ndarray) -> None:
+        self.xs.append(np.asarray(xs, dtype=np.int64))
+        self.ys.append(np.asarray(ys, dtype=np.int64))
+        self.values.append(np.asarray(values, dtype=np.float32))
+
+    def clear(self) -> None:
+        self.xs.clear()
+        self.ys.clear()
+        self.values.clear()
+
+    def composite(self, canves: Canvas, color: RGB) -> None:
+        """Blends the color over the canves by the coverage then clears it"""
+
+        xs, ys, values = (
+            np.concatenate(self.xs or [np.zeros(0, dtype=np.int64)]),
+            np.concatenate(self.ys or [np.zeros(0, dtype=np.int64)]),
+            np.concatenate(self.values or [np.zeros(0, dtype=np.float32)]),
+        )
+        self.clear()
+
+        Draw.blend(canves, xs, ys, values, color)
+
 
 class Draw:
     @staticmethod
-    def line(canves: Canvas, a: Vector, b: Vector, color: RGB, width: int = 1) -> None:
-        """Using Bresenham's line algorithm to draw a line from pointA to pointB"""
+    def line(
+        canves: Canvas,
+        a: Vector,
+        b: Vector,
+        color: RGB,
+        width: int = 1,
+        cap: LineCap = "round",
+    ) -> None:
+        """Using Bresenham's line algorithm to draw a line from pointA to pointB, wider lines are drawn as capsules"""
 
-        x0, y0 = a
-        x1, y1 = b
+        Draw.polyline(canves, np.array((tuple(a), tuple(b))), color, width, cap)
 
-        # if the change in x is greater then the change in y (a horizontal line)
-        if abs(x1 - x0) > abs(y1 - y0):
-            # if the line is going from right to left
-            if x0 > x1:
-                x0, x1 = x1, x0
-                y0, y1 = y1, y0
+    @staticmethod
+    def polyline(
+        canves: Canvas,
+        points: np.ndarray,
+        color: RGB,
+        width: int = 1,
+        cap: LineCap = "round",
+    ) -> None:
+        """Draws the lines between every consecutive pair of the (N, 2) points with one write"""
 
-            dx = x1 - x0
-            dy = y1 - y0
+        if width > 1:
+            Draw.fill_spans(
+                canves, *Draw.thick_polyline_spans(points, width, cap), color
+            )
+        else:
+            canves.set_many(*Draw.polyline_points(points), color)
 
-            dir = -1 if dy < 0 else 1
-            dy *= dir
+    @staticmethod
+    def polyline_points(points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """The (xs, ys) of Bresenham's lines between every consecutive pair of the (N, 2) points."""
+
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        if len(points) == 1:
+            points = np.concatenate((points, points))
+
+        a, b = points[:-1], points[1:]
+
+        # Lines where the change in x is greater go from left to right (horizontal lines),
+        # the rest go from top to bottom (vertical lines)
+        x_major = np.abs(b[:, 0] - a[:, 0]) > np.abs(b[:, 1] - a[:, 1])
+        swap = np.where(x_major, a[:, 0] > b[:, 0], a[:, 1] > b[:, 1])
+        start = np.where(swap[:, None], b, a)
+        end = np.where(swap[:, None], a, b)
+
+        major_axis = np.where(x_major, 0, 1)
+        minor_axis = 1 - major_axis
+        rows = np.arange(len(a))
+        start_major, start_minor = start[rows, major_axis], start[rows, minor_axis]
+        d_major = end[rows, major_axis] - start_major
+        d_minor = end[rows, minor_axis] - start_minor
+
+        # The step of every pixel along its segment
+        steps = d_major + 1
+        segments = np.repeat(rows, steps)
+        i = np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)
+
+        d_major, d_minor = d_major[segments], d_minor[segments]
+        majors = start_major[segments] + i
+        minors = start_minor[segments] + np.sign(d_minor) * (
+            (2 * np.abs(d_minor) * i + d_major) // np.maximum(2 * d_major, 1)
+        )
 
-            y = y0
-            d = dy * 2 - dx
+        x_major = x_major[segments]
+        xs = np.where(x_major, majors, minors)
+        ys = np.where(x_major, minors, majors)
 
-            for i in range(dx + 1):
-                for stroke in range(width):
-                    canves.set_at((x0 + i, y + stroke - width // 2), color)
+        return xs, ys
 
-                if d >= 0:
-                    d += -2 * dx
-                    y += dir
+    @staticmethod
+    def thick_polyline_spans(
+        points: np.ndarray, width: int, cap: LineCap = "round"
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The (rows, lefts, rights) spans of the pixels of a width wide stroke along the (N, 2) points."""
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points) == 1:
+            points = np.concatenate((points, points))
+        points -= 0.5 * (width % 2 == 0)
+
+        r = width / 2
+        a, b = points[:-1], points[1:]
+        lengths = np.hypot(*(b - a).T)
+
+        # The direction and the normal of every segment, a point is a segment going right
+        directions = np.where(
+            lengths[:, None] > 0,
+            (b - a) / np.maximum(lengths, 1e-12)[:, None],
+            (1.0, 0.0),
+        )
+        normals = np.stack((-directions[:, 1], directions[:, 0]), axis=1)
+        extend = r if cap == "square" else 0
+
+        # Every row each capsule can cover, square caps reach further out on their corners
+        reach = r + extend
+        tops = np.floor(np.minimum(a[:, 1], b[:, 1]) - reach).astype(np.int64)
+        bottoms = np.ceil(np.maximum(a[:, 1], b[:, 1]) + reach).astype(np.int64) + 1
+        counts = bottoms - tops
+        segments = np.repeat(np.arange(len(a)), counts)
+        rows = Draw.ranges(tops, counts)
+
+        a, b = a[segments], b[segments]
+        directions, normals = directions[segments], normals[segments]
+        lengths = lengths[segments]
+
+        # The rectangle is where the distance along the segment and across it are both in range
+        lefts = np.full(rows.size, -np.inf)
+        rights = np.full(rows.size, np.inf)
+        for axis, low, high in (
+            (directions, -extend, lengths + extend),
+            (normals, -r, r),
+        ):
+            # The distance is slope * x + offset along the row
+            slope = axis[:, 0]
+            offset = (rows - a[:, 1]) * axis[:, 1] - a[:, 0] * slope
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x_low, x_high = (low - offset) / slope, (high - offset) / slope
+            x_low, x_high = np.minimum(x_low, x_high), np.maximum(x_low, x_high)
+
+            # A row parallel to the axis is either all inside or all outside
+            parallel = slope == 0
+            inside = (low < offset) & (offset < high)
+            x_low = np.where(parallel, np.where(inside, -np.inf, np.inf), x_low)
+            x_high = np.where(parallel, np.where(inside, np.inf, -np.inf), x_high)
+
+            lefts, rights = np.maximum(lefts, x_low), np.minimum(rights, x_high)
+
+        if cap == "round":
+            # The rows that missed the rectangle are made empty spans so the discs can only widen them
+            empty = lefts >= rights
+            lefts[empty], rights[empty] = np.inf, -np.inf
+
+            for center in (a, b):
+                heights = rows - center[:, 1]
+                in_disc = np.abs(heights) < r
+                half_widths = np.sqrt(np.maximum(r**2 - heights**2, 0))
+                lefts = np.where(
+                    in_disc, np.minimum(lefts, center[:, 0] - half_widths), lefts
+                )
+                rights = np.where(
+                    in_disc, np.maximum(rights, center[:, 0] + half_widths), rights
+                )
 
-                d += 2 * dy
-        # if the change in y is greater then the change in x (a vertical line)
-        else:
-            # if the line is going from top to bottom
-            if y0 > y1:
-                x0, x1 = x1, x0
-                y0, y1 = y1, y0
+        # The pixels with their centers strictly between the span ends
+        spans = lefts < rights
+        lefts = np.floor(lefts[spans]).astype(np.int64) + 1
+        rights = np.ceil(rights[spans]).astype(np.int64)
 
-            dx = x1 - x0
-            dy = y1 - y0
+        return rows[spans], lefts, rights
 
-            dir = -1 if dx < 0 else 1
-            dx *= dir
+    @staticmethod
+    def aaline(
+        canves: Canvas,
+        a: Vector,
+        b: Vector,
+        color: RGB,
+        coverage: "Coverage | None" = None,
+    ) -> None:
+        """Using Xiolin Wu algorithm it will draw an Anti-Aliased line."""
 
-            x = x0
-            d = dx * 2 - dy
+        Draw.aapolyline(canves, np.array((tuple(a), tuple(b))), color, coverage)
 
-            for i in range(dy + 1):
-                for stroke in range(width):
-                    canves.set_at((x + stroke - width // 2, y0 + i), color)
+    @staticmethod
+    def aapolyline(
+        canves: Canvas,
+        points: np.ndarray,
+        color: RGB,
+        coverage: "Coverage | None" = None,
+    ) -> None:
+        """Draws the Anti-Aliased lines between every consecutive pair of the (N, 2) points, see aaline"""
 
-                if d >= 0:
-                    d += -2 * dy
-                    x += dir
+        target = coverage if coverage is not None else Coverage()
+        target.add(*Draw.aapolyline_coverage(points))
 
-                d += 2 * dx
+        if coverage is None:
+            target.composite(canves, color)
 
     @staticmethod
-    def aaline(canves: Canvas, a: Vector, b: Vector, color: RGB) -> None:
-        """Using Xiolin Wu algorithm it will draw an Anti-Aliased line"""
-
-        x0, y0 = a
-        x1, y1 = b
+    def aapolyline_coverage(
+        points: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The (xs, ys, coverages) of Wu's lines between every consecutive pair of the (N, 2) points."""
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points) == 1:
+            points = np.concatenate((points, points))
+
+        a, b = points[:-1], points[1:]
+
+        # Like the Bresenham lines, the major axis is walked forward
+        x_major = np.abs(b[:, 0] - a[:, 0]) > np.abs(b[:, 1] - a[:, 1])
+        swap = np.where(x_major, a[:, 0] > b[:, 0], a[:, 1] > b[:, 1])
+        start = np.where(swap[:, None], b, a)
+        end = np.where(swap[:, None], a, b)
+
+        major_axis = np.where(x_major, 0, 1)
+        minor_axis = 1 - major_axis
+        rows = np.arange(len(a))
+        start_major, start_minor = start[rows, major_axis], start[rows, minor_axis]
+        d_major = end[rows, major_axis] - start_major
+        gradients = (end[rows, minor_axis] - start_minor) / np.maximum(d_major, 1)
+
+        steps = np.rint(d_major).astype(np.int64) + 1
+        segments = np.repeat(rows, steps)
+        i = np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)
+
+        majors = (start_major[segments] + i).astype(np.int64)
+        minors = start_minor[segments] + gradients[segments] * i
+        floors = np.floor(minors)
+        fractions = minors - floors
+        floors = floors.astype(np.int64)
+
+        # The pixel the line passes through and the one after it across the line
+        majors = np.concatenate((majors, majors))
+        minors = np.concatenate((floors, floors + 1))
+        values = np.concatenate((1 - fractions, fractions))
+
+        x_major = np.concatenate((x_major[segments], x_major[segments]))
+        xs = np.where(x_major, majors, minors)
+        ys = np.where(x_major, minors, majors)
+        covered = values > 0
+
+        return xs[covered], ys[covered], values[covered]
 
-        if abs(x1 - x0) > abs(y1 - y0):
-            if x0 > x1:
-                x0, x1 = x1, x0
-                y0, y1 = y1, y0
-
-            dx = x1 - x0
-            dy = y1 - y0
-            m = dy / dx if dx != 0 else 1
+    @staticmethod
+    def circle(
+        canves: Canvas, c: Vector, r: int, color: RGB, filled: bool = False
+    ) -> None:
+        """Using the Mid-Point Circle algorithm it will draw a circle, filled circles are drawn a row at a time"""
 
-            # handling the start pixel brightness
-            overlap = 1 - ((x0 + 0.5) - int(x0 + 0.5))
-            dist_start = y0 - int(y0)
-            canves.set_at((int(x0 + 0.5), int(y0)), color, (1 - dist_start) * overlap)
+        xs, ys = Draw.circle_octant(r)
 
-            # handling the end pixel brightness
-            overlap = (x1 - 0.5) - int(x1 - 0.5)
-            distEnd = y1 - int(y1)
-            canves.set_at((int(x1 + 0.5), int(y1)), color, (1 - distEnd) * overlap)
+        # The circle is identical in 8 sides so the octant is mirrored to the others
+        xs, ys = (
+            np.concatenate((xs, -ys, -ys, xs, -xs, ys, ys, -xs)) + c.x,
+            np.concatenate((ys, -xs, xs, -ys, -ys, xs, -xs, ys)) + c.y,
+        )
 
-            for i in range(1, int(dx)):
-                x = x0 + i
-                y = y0 + m * i
+        if not filled:
+            canves.set_many(xs, ys, color)
+            return
 
-                ix = int(x)
-                iy = int(y)
+        # Every row is filled from its leftmost to its rightmost point
+        rows, row_of_point = np.unique(ys, return_inverse=True)
+        lefts = np.full(rows.size, c.x)
+        rights = np.full(rows.size, c.x)
+        np.minimum.at(lefts, row_of_point, xs)
+        np.maximum.at(rights, row_of_point, xs)
 
-                dist = y - iy
+        for y, left, right in zip(rows.tolist(), lefts.tolist(), rights.tolist()):
+            canves.set_span(y, left, right + 1, color)
 
-                canves.set_at((ix, iy), color, 1 - dist)
-                canves.set_at((ix, iy + 1), color, dist)
-        else:
-            if y0 > y1:
-                x0, x1 = x1, x0
-                y0, y1 = y1, y0
+    @staticmethod
+    def circle_octant(r: int) -> tuple[np.ndarray, np.ndarray]:
+        """The (xs, ys) of the Mid-Point Circle points from the top of the circle to 45 degrees, relative to the center"""
 
-            dx = x1 - x0
-            dy = y1 - y0
-            m = dx / dy if dy != 0 else 1
+        xs = np.arange(Draw.circle_octant_size(r))
+        return xs, Draw.circle_octant_at(r, xs)
 
-            # handling the start pixel brightness
-            overlap = 1 - ((y0 + 0.5) - int(y0 + 0.5))
-            dist_start = x0 - int(x0)
-            canves.set_at((int(x0 + 0.5), int(y0)), color, (1 - dist_start) * overlap)
+    @staticmethod
+    def circle_octant_at(r: int, xs: np.ndarray) -> np.ndarray:
+        """The ys of the Mid-Point Circle octant points at the given xs, in closed form."""
 
-            # handling the end pixel brightness
-            overlap = (y1 - 0.5) - int(y1 - 0.5)
-            distEnd = x1 - int(x1)
-            canves.set_at((int(x1 + 0.5), int(y1)), color, (1 - distEnd) * overlap)
+        def rows(xs: np.ndarray) -> np.ndarray:
+            areas = 4 * (r * r - xs * xs)
+            roots = np.floor(np.sqrt(np.maximum(areas, 0))).astype(np.int64)
+            roots += (roots + 1) ** 2 <= areas  # the float square root can be one off
+            roots -= roots**2 > areas
+            return (roots + 1) // 2
 
-            for i in range(1, int(dy)):
-                x = x0 + m * i
-                y = y0 + i
+        xs = np.asarray(xs, dtype=np.int64)
+        return -np.maximum(rows(xs), rows(xs - 1) - 1)
 
-                ix = int(x)
-                iy = int(y)
+    @staticmethod
+    def circle_octant_size(r: int) -> int:
+        """The number of Mid-Point Circle octant points, the octant goes on while x <= -y of the previous point"""
 
-                dist = x - ix
+        first = max(int(r / np.sqrt(2)) - 2, 0)
+        xs = np.arange(first, first + 6)
+        previous_rows = np.where(xs > 0, -Draw.circle_octant_at(r, xs - 1), r)
 
-                canves.set_at((ix, iy), color, 1 - dist)
-                canves.set_at((ix + 1, iy), color, dist)
+        return first + int(np.argmin(xs <= previous_rows))
 
     @staticmethod
-    def circle(
-        canves: Canvas, c: Vector, r: int, color: RGB, filled: bool = False
+    def aacircle(
+        canves: Canvas,
+        c: Vector,
+        r: int,
+        color: RGB,
+        filled: bool = False,
+        coverage: "Coverage | None" = None,
     ) -> None:
-        """Using the Mid-Point Circle algorithm it will draw a circle."""
-
-        # y_value: (x_min, x_max)
-        spans: dict[int, (int, int)] = {}
-        r = r
-
-        x = 0
-        y = -r
-        d = (
-            -r + 0.25
-        )  # the 0.25 could be removed for slightly faster performence but woth slight different circle
-
-        while x <= -y:
-            if d > 0:
-                y += 1
-                d += 2 * y
-            d += 2 * x + 1
-
-            # Draw the circle points 8 times since the circle is identical in 8 sides
-            canves.set_at(Vector(c.x + x, c.y + y), color)  # 0-45 deg
-            canves.set_at(Vector(c.x - y, c.y - x), color)  # 45-90 deg
-            canves.set_at(Vector(c.x - y, c.y + x), color)  # 90-135 deg
-            canves.set_at(Vector(c.x + x, c.y - y), color)  # 135-180 deg
-            canves.set_at(Vector(c.x - x, c.y - y), color)  # 180-225 deg
-            canves.set_at(Vector(c.x + y, c.y + x), color)  # 225-270 deg
-            canves.set_at(Vector(c.x + y, c.y - x), color)  # 270-315 deg
-            canves.set_at(Vector(c.x - x, c.y + y), color)  # 315-360 deg
-            spans[c.y + y] = (c.x - x, c.x + x)
-            spans[c.y - x] = (c.x - y, c.x + y)
-            spans[c.y + x] = (c.x - y, c.x + y)
-            spans[c.y - y] = (c.x - x, c.x + x)
-
-            x += 1
+        """Draws an Anti-Aliased circle by how much of every pixel it covers, into the coverage if there is one"""
+
+        # The outline covers the pixels within a pixel of the radius and a filled circle the pixels
+        # within half a pixel of it, the pixels inside of that band are fully covered
+        band = 0.5 if filled else 1
+        dys, inners, outers = Draw.annulus_rows(max(r - band, 0), r + band)
+
+        lengths = np.maximum(outers - inners + 1, 0)
+        xs = Draw.ranges(inners, lengths)
+        ys = np.repeat(dys, lengths)
+        xs, ys = np.concatenate((xs, -xs[xs > 0])), np.concatenate((ys, ys[xs > 0]))
+
+        distances = np.hypot(xs, ys)
+        if filled:
+            values = np.clip(r + 0.5 - distances, 0, 1)
+        else:
+            values = np.clip(1 - np.abs(distances - r), 0, 1)
+
+        target = coverage if coverage is not None else Coverage()
+        target.add(xs + c.x, ys + c.y, values)
+
+        if coverage is None:
+            target.composite(canves, color)
 
         if not filled:
             return
 
-        # drawing the pixels
-        for y, xs in spans.items():
-            x0, x1 = xs
+        # The inside is the pixels of every row short of the band
+        rows, lefts, rights = (
+            dys[inners > 0],
+            -inners[inners > 0] + 1,
+            inners[inners > 0],
+        )
+        if coverage is None and Canvas.pack(color) & 0xFF == 0xFF:
+            Draw.fill_spans(canves, rows + c.y, lefts + c.x, rights + c.x, color)
+            return
+
+        # Blended a band of rows at a time so only a band of pixels is held at once
+        for first in range(0, rows.size, CANVAS_TILE_SIZE):
+            band_rows = rows[first : first + CANVAS_TILE_SIZE]
+            band_lefts = lefts[first : first + CANVAS_TILE_SIZE]
+            lengths = rights[first : first + CANVAS_TILE_SIZE] - band_lefts
+            xs = Draw.ranges(band_lefts, lengths)
+            ys = np.repeat(band_rows, lengths)
+
+            target = coverage if coverage is not None else Coverage()
+            target.add(xs + c.x, ys + c.y, np.ones(xs.size, dtype=np.float32))
+            if coverage is None:
+                target.composite(canves, color)
+
+    @staticmethod
+    def annulus_rows(
+        inner_radius: float, outer_radius: float
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The (rows, inners, outers) of the xs >= 0 of every row between the two radii around the center"""
 
-            dx = abs(x1 - x0)
-            x_min = min(x0, x1)
+        dys = np.arange(-int(outer_radius), int(outer_radius) + 1)
+        outers = np.floor(np.sqrt(np.maximum(outer_radius**2 - dys**2, 0)))
+        inners = np.ceil(np.sqrt(np.maximum(inner_radius**2 - dys**2, 0)))
 
-            for j in range(1, dx):
-                canves.set_at((x_min + j, y), color)
+        return dys, inners.astype(np.int64), outers.astype(np.int64)
 
     @staticmethod
-    def aacircle(
-        canves: Canvas, c: Vector, r: int, color: RGB, filled: bool = False
+    def ellipse(
+        canves: Canvas, c: Vector, radii: Vector, color: RGB, filled: bool = False
     ) -> None:
-        """Using the Mid-Point Circle algorithm it will draw a circle."""
-
-        # y_value: (x_min, x_max)
-        spans: dict[int, (int, int)] = {}
-        r = r
-
-        x = 0
-        y = -r
-        d = (
-            -r + 0.25
-        )  # the 0.25 could be removed for slightly faster performence but woth slight different circle
-
-        while x <= -y:
-            if d > 0:
-                y += 1
-                d += 2 * y
-            d += 2 * x + 1
-
-            # Draw the circle points 8 times since the circle is identical in 8 sides
-            canves.set_at(Vector(c.x + x, c.y + y), color)  # 0-45 deg
-            canves.set_at(Vector(c.x - y, c.y - x), color)  # 45-90 deg
-            canves.set_at(Vector(c.x - y, c.y + x), color)  # 90-135 deg
-            canves.set_at(Vector(c.x + x, c.y - y), color)  # 135-180 deg
-            canves.set_at(Vector(c.x - x, c.y - y), color)  # 180-225 deg
-            canves.set_at(Vector(c.x + y, c.y + x), color)  # 225-270 deg
-            canves.set_at(Vector(c.x + y, c.y - x), color)  # 270-315 deg
-            canves.set_at(Vector(c.x - x, c.y + y), color)  # 315-360 deg
-            spans[c.y + y] = (c.x - x, c.x + x)
-            spans[c.y - x] = (c.x - y, c.x + y)
-            spans[c.y + x] = (c.x - y, c.x + y)
-            spans[c.y - y] = (c.x - x, c.x + x)
-
-            x += 1
+        """Draws the ellipse with the horizontal and vertical radii, a row at a time"""
 
-        if not filled:
+        rx, ry = abs(radii[0]), abs(radii[1])
+
+        # The half width of every row of the ellipse
+        dys = np.arange(-ry, ry + 1)
+        heights = dys / ry if ry else np.zeros(1)
+        half_widths = np.floor(rx * np.sqrt(1 - heights**2) + 0.5).astype(np.int64)
+
+        if filled:
+            for dy, half_width in zip(dys.tolist(), half_widths.tolist()):
+                canves.set_span(c.y + dy, c.x - half_width, c.x + half_width + 1, color)
             return
 
-        # drawing the pixels
-        for y, xs in spans.items():
-            x0, x1 = xs
+        # Every row of the outline reaches in to where the narrower of the rows around it ends,
+        # so the outline has no gaps where it's steep
+        around = np.pad(half_widths, 1, constant_values=-1)
+        inner = np.clip(np.minimum(around[:-2], around[2:]) + 1, 0, half_widths)
+        lengths = half_widths - inner + 1
+
+        xs = Draw.ranges(inner, lengths)
+        ys = np.repeat(dys, lengths)
+        canves.set_many(
+            np.concatenate((xs, -xs)) + c.x, np.concatenate((ys, ys)) + c.y, color
+        )
+
+    @staticmethod
+    def blend(
+        canves: Canvas, xs: np.ndarray, ys: np.ndarray, coverage: np.ndarray, color: RGB
+    ) -> None:
+        """Blends the color over the pixels by the coverage of each in [0, 1], repeated pixels keep their highest coverage"""
 
-            dx = abs(x1 - x0)
-            x_min = min(x0, x1)
+        inside = (
+            (xs >= 0) & (xs < canves.w) & (ys >= 0) & (ys < canves.h) & (coverage > 0)
+        )
+        xs, ys, coverage = xs[inside], ys[inside], coverage[inside]
+        if not xs.size:
+            return
 
-            for j in range(1, dx):
-                canves.set_at((x_min + j, y), color)
+        # The first of every pixel is its highest coverage
+        keys = ys * canves.w + xs
+        order = np.lexsort((-coverage, keys))
+        keys = keys[order]
+        first = np.r_[True, keys[1:] != keys[:-1]]
+        xs, ys, coverage = xs[order][first], ys[order][first], coverage[order][first]
+
+        # The color with its alpha scaled by the coverage of each pixel
+        value = Canvas.pack(color)
+        alphas = np.rint((value & 0xFF) * coverage).astype(np.uint32)
+        top_pixels = (value & 0xFFFFFF00) | alphas
+
+        # Only the partly covered pixels need blending, the fully covered ones are replaced
+        pixels = top_pixels
+        partly = (alphas > 0) & (alphas < 0xFF)
+        if partly.any():
+            pixels[partly] = Color.over(
+                canves.get_many(xs[partly], ys[partly]), top_pixels[partly]
+            )
+
+        covered = alphas > 0
+        canves.set_many(xs[covered], ys[covered], pixels[covered])
 
     @staticmethod
     def arc(
@@ -244,31 +489,224 @@ class Draw:
         color: RGB,
         filled: bool = False,
     ) -> None:
-        pass
+        """Draws the arc counterclockwise from radians[0] to radians[1], filled arcs are pie slices."""
+
+        start, stop = radians
+        if stop - start >= 2 * np.pi:
+            Draw.circle(canves, center, radius, color, filled)
+            return
+
+        start %= 2 * np.pi
+        stop = start + (stop - start) % (2 * np.pi)
+        xs, ys = Draw.arc_points(radius, start, stop)
+
+        if not filled:
+            canves.set_many(xs + center.x, ys + center.y, color)
+            return
+
+        rows, lefts, rights = Draw.pie_spans(radius, start, stop, ys)
+        Draw.fill_spans(
+            canves, rows + center.y, lefts + center.x, rights + center.x, color
+        )
+
+    @staticmethod
+    def arc_points(r: int, start: float, stop: float) -> tuple[np.ndarray, np.ndarray]:
+        """The (xs, ys) of the Mid-Point Circle points between the angles, relative to the center."""
+
+        eighth = np.pi / 4
+        sectors = np.arange(int(start // eighth), int(stop // eighth) + 1)
+        lows = np.maximum(start, sectors * eighth)
+        highs = np.minimum(stop, (sectors + 1) * eighth)
+
+        # The octant goes from 90 degrees at x = 0 down to 45 degrees, even eighths run it backwards
+        quarters = sectors // 2 * (np.pi / 2)
+        odd = sectors % 2 == 1
+        octant_lows = np.where(odd, lows - quarters, quarters + np.pi / 2 - highs)
+        octant_highs = np.where(odd, highs - quarters, quarters + np.pi / 2 - lows)
+
+        size = Draw.circle_octant_size(r)
+        firsts = np.clip(
+            np.floor(r * np.cos(octant_highs)).astype(np.int64) - 1, 0, size
+        )
+        lasts = np.clip(np.ceil(r * np.cos(octant_lows)).astype(np.int64) + 2, 0, size)
+        counts = np.maximum(lasts - firsts, 0)
+
+        octant_xs = Draw.ranges(firsts, counts)
+        octant_ys = Draw.circle_octant_at(r, octant_xs)
+        mirrors = OCTANT_MIRRORS[np.repeat(sectors % 8, counts)]
+        xs = mirrors[:, 0] * octant_xs + mirrors[:, 1] * octant_ys
+        ys = mirrors[:, 2] * octant_xs + mirrors[:, 3] * octant_ys
+
+        # The y axis points down so the angles are measured against -y
+        angles = (np.arctan2(-ys, xs) - start) % (2 * np.pi)
+        on_arc = (angles <= stop - start + 1e-9) | (angles >= 2 * np.pi - 1e-9)
+
+        return xs[on_arc], ys[on_arc]
+
+    @staticmethod
+    def pie_spans(
+        r: int, start: float, stop: float, arc_ys: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The (rows, lefts, rights) spans of the pie slice, relative to the center, rights are exclusive."""
+
+        # The half width of every row of the filled circle, from the octant and its mirror across 45 degrees
+        octant_xs, octant_ys = Draw.circle_octant(r)
+        half_widths = np.full(r + 1, -1)
+        np.maximum.at(half_widths, -octant_ys, octant_xs)
+        half_widths[octant_xs] = np.maximum(half_widths[octant_xs], -octant_ys)
+
+        rows = np.arange(
+            min(arc_ys.min(initial=0), 0), max(arc_ys.max(initial=0), 0) + 1
+        )
+        row_half_widths = half_widths[np.abs(rows)]
+
+        def side(slope: float, offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+            """The [left, right] xs of the row pixels with slope * x + offset >= 0, clamped to the circle"""
+
+            if abs(slope) < 1e-12:
+                inside = offsets >= -1e-9
+                return np.where(inside, -r, r + 1), np.where(inside, r, -r - 1)
+
+            bounds = -offsets / slope
+            if slope > 0:
+                return np.clip(np.ceil(bounds - 1e-9), -r, r + 1), np.full(rows.size, r)
+            return np.full(rows.size, -r), np.clip(np.floor(bounds + 1e-9), -r - 1, r)
+
+        # A pixel is counterclockwise of the start radius and clockwise of the stop radius
+        start_lefts, start_rights = side(-np.sin(start), -rows * np.cos(start))
+        stop_lefts, stop_rights = side(np.sin(stop), rows * np.cos(stop))
+
+        if stop - start <= np.pi:
+            lefts = np.maximum(start_lefts, stop_lefts)
+            rights = np.minimum(start_rights, stop_rights)
+        else:
+            rows = np.concatenate((rows, rows))
+            row_half_widths = np.concatenate((row_half_widths, row_half_widths))
+            lefts = np.concatenate((start_lefts, stop_lefts))
+            rights = np.concatenate((start_rights, stop_rights))
+
+        lefts = np.maximum(lefts, -row_half_widths).astype(np.int64)
+        rights = np.minimum(rights, row_half_widths).astype(np.int64) + 1
+
+        return rows, lefts, rights
 
     @staticmethod
     def rectangle(
         canves: Canvas, topleft: Vector, size: Vector, color: RGB, filled: bool = False
     ) -> None:
-        x, y = topleft
-        w, h = size
+        """Draws the rectangle from topleft to topleft + size (inclusive) with bulk writes"""
 
-        for dy in (0, h):
-            for dx in (0, w):
-                canves.set_at((x + dx, y + dy), color)
+        x0, y0 = topleft
+        x1, y1 = x0 + size[0], y0 + size[1]
+        left, right = min(x0, x1), max(x0, x1) + 1
+        top, bottom = min(y0, y1), max(y0, y1) + 1
 
-        if not filled:
+        if filled:
+            canves.set_rect(left, top, right, bottom, color)
             return
 
-        for dy in range(1, h - 1):
-            for dx in range(1, w - 1):
-                canves.set_at((x + dx, y + dy), color)
+        canves.set_span(top, left, right, color)
+        canves.set_span(bottom - 1, left, right, color)
+        canves.set_rect(left, top, left + 1, bottom, color)
+        canves.set_rect(right - 1, top, right, bottom, color)
 
     @staticmethod
     def polygon(
-        canves: Canvas, vertices: tuple[Vector], color: RGB, filled: bool = False
+        canves: Canvas,
+        vertices: tuple[Vector],
+        color: RGB,
+        filled: bool = False,
+        rule: FillRule = "even-odd",
     ) -> None:
-        pass
+        """Draws the closed polygon outline as a Bresenham polyline, filled polygons are scanline rasterized."""
+
+        if filled and len(vertices) > 2:
+            Draw.polygon_fill(canves, vertices, color, rule)
+
+        points = np.array([tuple(vertex) for vertex in vertices], dtype=np.int64)
+        Draw.polyline(canves, np.concatenate((points, points[:1])), color)
+
+    @staticmethod
+    def polygon_fill(
+        canves: Canvas, vertices: tuple[Vector], color: RGB, rule: FillRule
+    ) -> None:
+        """Fills the inside of the polygon by the fill rule, without its outline"""
+
+        points = np.array([tuple(vertex) for vertex in vertices], dtype=np.int64)
+        x0, y0 = points.T
+        x1, y1 = np.roll(points, -1, axis=0).T
+
+        # The edge table without the horizontal edges, which don't cross any scanline
+        sloped = y0 != y1
+        x0, y0, x1, y1 = x0[sloped], y0[sloped], x1[sloped], y1[sloped]
+        tops, bottoms = np.minimum(y0, y1), np.maximum(y0, y1)
+
+        # The crossings of every edge with the scanlines from its top to its bottom (exclusive)
+        counts = bottoms - tops
+        edges = np.repeat(np.arange(counts.size), counts)
+        ys = Draw.ranges(tops, counts)
+        xs = x0[edges] + (ys - y0[edges]) * (x1 - x0)[edges] / (y1 - y0)[edges]
+        directions = np.sign(y1 - y0)[edges]
+
+        order = np.lexsort((xs, ys))
+        xs, ys, directions = xs[order], ys[order], directions[order]
+
+        # A closed polygon crosses every scanline an even number of times and ends it with a zero winding,
+        # so the crossings can be paired and counted across the scanlines without splitting them
+        if rule == "nonzero":
+            starts = np.flatnonzero(np.cumsum(directions)[:-1])
+        else:
+            starts = np.arange(0, xs.size - 1, 2)
+
+        # The pixels with their centers between two crossings
+        lefts = np.ceil(xs[starts]).astype(np.int64)
+        rights = np.floor(xs[starts + 1]).astype(np.int64) + 1
+        Draw.fill_spans(canves, ys[starts], lefts, rights, color)
+
+    @staticmethod
+    def fill_spans(
+        canves: Canvas,
+        rows: np.ndarray,
+        lefts: np.ndarray,
+        rights: np.ndarray,
+        color: RGB,
+    ) -> None:
+        """Fills the horizontal spans of pixels, rights are exclusive, with one write per tile they touch"""
+
+        lefts, rights = np.maximum(lefts, 0), np.minimum(rights, canves.w)
+        inside = (rows >= 0) & (rows < canves.h) & (lefts < rights)
+        rows, lefts, rights = rows[inside], lefts[inside], rights[inside]
+        if not rows.size:
+            return
+
+        # The spans are cut at the tile edges and the pieces grouped by their tile
+        first_cols = lefts // CANVAS_TILE_SIZE
+        counts = (rights - 1) // CANVAS_TILE_SIZE - first_cols + 1
+        spans = np.repeat(np.arange(rows.size), counts)
+        cols = Draw.ranges(first_cols, counts)
+        rows = rows[spans]
+        lefts = np.maximum(lefts[spans], cols * CANVAS_TILE_SIZE)
+        rights = np.minimum(rights[spans], (cols + 1) * CANVAS_TILE_SIZE)
+
+        value = np.uint32(Canvas.pack(color))
+        for tile, tile_rows, tile_lefts, pieces in canves.tile_groups(lefts, rows):
+            left, top, right, bottom = canves.tile_rect(tile)
+            tile_rights = rights[pieces] - left
+
+            # Every span is a +1 where it starts and a -1 where it ends, so the running sum of
+            # the rows is positive exactly inside the spans
+            marks = np.zeros((bottom - top, right - left + 1), dtype=np.int32)
+            np.add.at(marks, (tile_rows, tile_lefts), 1)
+            np.add.at(marks, (tile_rows, tile_rights), -1)
+            filled = np.cumsum(marks, axis=1)[:, :-1] > 0
+
+            if filled.all():
+                canves.set_rect(left, top, right, bottom, color)
+            else:
+                pixels = canves.region(left, top, right, bottom)
+                canves.set_rect(
+                    left, top, right, bottom, np.where(filled, value, pixels)
+                )
 
     @staticmethod
     def vertex_array(
@@ -278,27 +716,268 @@ class Draw:
 
     @staticmethod
     def bezier(
-        canves: Canvas, points: tuple[Vector], color: RGB, filled: bool = False
+        canves: Canvas,
+        points: tuple[Vector],
+        color: RGB,
+        filled: bool = False,
+        width: int = 1,
+        tolerance: float = BEZIER_TOLERANCE,
     ) -> None:
-        pass
+        """Draws the Bezier curve of the control points, of any degree, as one polyline."""
+
+        Draw.flat_curve(
+            canves, Draw.bezier_points(points, tolerance), color, filled, width
+        )
+
+    @staticmethod
+    def catmull_rom(
+        canves: Canvas,
+        points: tuple[Vector],
+        color: RGB,
+        filled: bool = False,
+        width: int = 1,
+        tolerance: float = BEZIER_TOLERANCE,
+    ) -> None:
+        """Draws the Catmull-Rom spline passing through the points as one polyline, see bezier"""
+
+        Draw.flat_curve(
+            canves, Draw.catmull_rom_points(points, tolerance), color, filled, width
+        )
+
+    @staticmethod
+    def flat_curve(
+        canves: Canvas, points: np.ndarray, color: RGB, filled: bool, width: int
+    ) -> None:
+        """Draws the (N, 2) points of a flattened curve as a polyline, filled ones closed by their chord"""
+
+        if filled and len(points) > 2:
+            Draw.polygon_fill(canves, points, color, "even-odd")
+
+        Draw.polyline(canves, points, color, width)
+
+    @staticmethod
+    def bezier_points(
+        points: tuple[Vector], tolerance: float = BEZIER_TOLERANCE
+    ) -> np.ndarray:
+        """The (N, 2) pixels of the polyline the Bezier curve of the control points is flattened to"""
+
+        controls = np.array([tuple(point) for point in points], dtype=np.float64)
+        return Draw.flatten_beziers(controls[None], tolerance)
+
+    @staticmethod
+    def catmull_rom_points(
+        points: tuple[Vector], tolerance: float = BEZIER_TOLERANCE
+    ) -> np.ndarray:
+        """The (N, 2) pixels of the polyline the Catmull-Rom spline through the points is flattened to."""
+
+        points = np.array([tuple(point) for point in points], dtype=np.float64)
+        if len(points) < 2:
+            return Draw.flatten_beziers(points[None], tolerance)
+
+        padded = np.concatenate((points[:1], points, points[-1:]))
+        p0, p1, p2, p3 = padded[:-3], padded[1:-2], padded[2:-1], padded[3:]
+        controls = np.stack((p1, p1 + (p2 - p0) / 6, p2 - (p3 - p1) / 6, p2), axis=1)
+
+        return Draw.flatten_beziers(controls, tolerance)
+
+    @staticmethod
+    def flatten_beziers(controls: np.ndarray, tolerance: float) -> np.ndarray:
+        """The (N, 2) pixels of the polyline through the Bezier curves of the (S, n + 1, 2) controls."""
+
+        degree = controls.shape[1] - 1
+        pieces = max(degree, 1)
+        curves = np.repeat(np.arange(len(controls)), pieces)
+        starts = np.tile(np.arange(pieces) / pieces, len(controls))
+        ends = starts + 1 / pieces
+        probes = np.array((0.0, 0.25, 0.5, 0.75, 1.0))
+
+        kept_curves, kept_starts = [], []
+        for depth in range(BEZIER_MAX_DEPTH + 1):
+            if not curves.size:
+                break
+
+            ts = starts[:, None] + (ends - starts)[:, None] * probes
+            samples = Draw.bezier_at(controls[curves], ts)
+
+            # The distance of the inner probes from the chord, the probes are projected onto it
+            a, chord = samples[:, :1], samples[:, -1:] - samples[:, :1]
+            offsets = samples[:, 1:-1] - a
+            lengths = np.maximum(np.sum(chord**2, axis=2), 1e-12)
+            along = np.clip(np.sum(offsets * chord, axis=2) / lengths, 0, 1)
+            errors = np.hypot(*np.moveaxis(offsets - along[..., None] * chord, 2, 0))
+
+            flat = (errors.max(axis=1) <= tolerance) | (depth == BEZIER_MAX_DEPTH)
+            kept_curves.append(curves[flat])
+            kept_starts.append(starts[flat])
+
+            curves, starts, ends = curves[~flat], starts[~flat], ends[~flat]
+            middles = (starts + ends) / 2
+            curves = np.repeat(curves, 2)
+            starts, ends = (
+                np.stack((starts, middles), axis=1).ravel(),
+                np.stack((middles, ends), axis=1).ravel(),
+            )
+
+        curves, starts = np.concatenate(kept_curves), np.concatenate(kept_starts)
+        order = np.lexsort((starts, curves))
+        curves, starts = curves[order], starts[order]
+
+        points = Draw.bezier_at(controls[curves], starts[:, None])[:, 0]
+        points = np.rint(np.concatenate((points, controls[-1, -1:]))).astype(np.int64)
+
+        # Pieces shorter than a pixel round to the same pixel as their neighbors
+        moved = np.any(points[1:] != points[:-1], axis=1)
+        return np.concatenate((points[:1], points[1:][moved]))
+
+    @staticmethod
+    def bezier_at(controls: np.ndarray, ts: np.ndarray) -> np.ndarray:
+        """The (K, M, 2) points of the K Bezier curves of the (K, n + 1, 2) controls at their (K, M) parameters"""
+
+        degree = controls.shape[1] - 1
+        powers = np.arange(degree + 1)
+        binomials = np.array(
+            [comb(degree, power) for power in powers], dtype=np.float64
+        )
+
+        ts = ts[..., None]
+        weights = binomials * ts**powers * (1 - ts) ** (degree - powers)
+
+        return np.einsum("kmj,kjd->kmd", weights, controls)
+
+    @staticmethod
+    def fill(
+        canves: Canvas, pos: Vector, color: RGB, replace_all: bool = False
+    ) -> None:
+        """Using a scanline Flood-Fill it will fill the whole area that pos lies in, or every pixel of its color with replace_all"""
+
+        if not canves.is_inside(pos):
+            return
+
+        x, y = int(pos[0]), int(pos[1])
+        base_color = canves.get_at((x, y))
+        if base_color == Canvas.pack(color):
+            return
+
+        if replace_all:
+            # A band of rows at a time so only a band of the board is read at once
+            for top in range(0, canves.h, CANVAS_TILE_SIZE):
+                bottom = min(top + CANVAS_TILE_SIZE, canves.h)
+                same = canves.region(0, top, canves.w, bottom) == base_color
+                rows, starts, ends = Draw.runs(same)
+                Draw.fill_spans(canves, rows + top, starts, ends, color)
+            return
+
+        # The area is searched in a window around pos that grows while the area reaches its edges,
+        # so only about the bounding box of the area is read
+        reach = CANVAS_TILE_SIZE
+        while True:
+            left, top = max(x - reach, 0), max(y - reach, 0)
+            right, bottom = min(x + reach + 1, canves.w), min(y + reach + 1, canves.h)
+            same = canves.region(left, top, right, bottom) == base_color
+            rows, starts, ends = Draw.flood_runs(same, x - left, y - top)
+
+            if not (
+                (left > 0 and np.any(starts == 0))
+                or (top > 0 and np.any(rows == 0))
+                or (right < canves.w and np.any(ends == right - left))
+                or (bottom < canves.h and np.any(rows == bottom - top - 1))
+            ):
+                break
+            reach *= 2
+
+        Draw.fill_spans(canves, rows + top, starts + left, ends + left, color)
 
     @staticmethod
-    def fill(canves: Canvas, pos: Vector, color: RGB) -> None:
-        """Using the Flood-Fill algorithm it will fill the whole area that pos lies in"""
+    def ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """The counts consecutive numbers from every start, concatenated"""
+
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
 
-        stack: list[Vector] = [Vector(pos)]
-        base_color = canves.get_at(pos)
+        return offsets + np.arange(counts.sum())
 
-        while stack:
-            cell = stack.pop()
+    @staticmethod
+    def runs(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The (rows, starts, ends) of the runs of True of every row in (row, start) order, ends are exclusive"""
+
+        edges = np.diff(np.pad(mask, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+        rows, starts = np.nonzero(edges == 1)
+        ends = np.nonzero(edges == -1)[1]
 
-            if canves.is_inside(cell) and canves.get_at(cell) == base_color:
-                stack.append(cell + Vector.north())
-                stack.append(cell + Vector.east())
-                stack.append(cell + Vector.south())
-                stack.append(cell + Vector.west())
+        return rows, starts, ends
 
-                canves.set_at((int(cell.x), int(cell.y)), color)
+    @staticmethod
+    def flood_runs(
+        mask: np.ndarray, x: int, y: int
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The (rows, starts, ends) of the runs of True 4-connected to (x, y), ends are exclusive."""
+
+        runs_rows, starts, ends = Draw.runs(mask)
+
+        # The runs as positions on the board rows laid end to end, so they are sorted by both
+        # starts and ends and the runs touching a range of a row are one searchsorted away
+        width = mask.shape[1] + 1
+        starts_keys = runs_rows * width + starts
+        ends_keys = runs_rows * width + ends
+
+        seed = np.searchsorted(starts_keys, y * width + x, "right") - 1
+        visited = np.zeros(starts.size, dtype=bool)
+        visited[seed] = True
+        frontier = np.array([seed])
+        while frontier.size:
+            # The runs of the rows above and below each frontier run that overlap it
+            # (the rows outside of the mask have no runs so they find empty ranges)
+            rows = np.concatenate((runs_rows[frontier] - 1, runs_rows[frontier] + 1))
+            lefts = np.tile(starts[frontier], 2)
+            rights = np.tile(ends[frontier], 2)
+
+            firsts = np.searchsorted(ends_keys, rows * width + lefts, "right")
+            lasts = np.searchsorted(starts_keys, rows * width + rights, "left")
+            counts = np.maximum(lasts - firsts, 0)
+
+            # Every index from first to last of each range, as one array
+            touching = Draw.ranges(firsts, counts)
+            frontier = np.unique(touching[~visited[touching]])
+            visited[frontier] = True
+
+        return runs_rows[visited], starts[visited], ends[visited]
+
+    @staticmethod
+    @lru_cache(maxsize=GRID_CACHE_SIZE)
+    def grid_color(color_table: ColorTable, zoom: float) -> RGB:
+        """The grid color gets closer to the primary foreground the more zoomed in"""
+
+        return (
+            color_table["fg_secondary"]
+            .blended(color_table["fg_primary"], min(zoom / (ZOOM_MAX), 1))
+            .rgb
+        )
+
+    @staticmethod
+    @lru_cache(maxsize=GRID_CACHE_SIZE)
+    def grid_overlay(
+        zoom: float, cell_size: float, w: int, h: int, color: RGB
+    ) -> pygame.Surface:
+        """Pre-renders the grid lines of a window worth of cells onto a transparent surface"""
+
+        cell = cell_size * zoom
+
+        # Enough cells to cover the window from any offset, but never more than the canves has
+        cols = min(w, int(WINDOW_SIZE[0] // cell) + 2)
+        rows = min(h, int(WINDOW_SIZE[1] // cell) + 2)
+        width = int(cols * cell) + 1
+        height = int(rows * cell) + 1
+
+        overlay = pygame.Surface((width, height), pygame.SRCALPHA)
+
+        for row in range(rows + 1):
+            y = int(row * cell)
+            pygame.draw.line(overlay, color, (0, y), (width - 1, y))
+
+        for column in range(cols + 1):
+            x = int(column * cell)
+            pygame.draw.line(overlay, color, (x, 0), (x, height - 1))
+
+        return overlay
 
     def draw_canvas(
         surf: pygame.Surface,
@@ -317,32 +996,27 @@ class Draw:
         bottom = canves.h * cell_size * zoom + offset.y
         right = canves.w * cell_size * zoom + offset.x
 
+        # Only the pixels inside the window are rendered
+        col0, row0, col1, row1 = camera.visible_cells(canves.surf.get_size())
+        (view_left, view_top), (view_right, view_bottom) = camera.to_world_many(
+            ((col0, row0), (col1, row1)), "nw"
+        )
+
         canves.surf.fill(ct["bg_primary"].rgb)
 
         # ---------- Draw pixels ----------
-        for row in range(canves.h):
-            for col in range(canves.w):
-                color = Color(canves.get_at((col, row)))
-                if not color.a:
-                    continue
-
-                pygame.draw.rect(
-                    canves.surf,
-                    color.rgb,
-                    (
-                        col * cell_size * zoom + offset.x,
-                        row * cell_size * zoom + offset.y,
-                        cell_size * zoom,
-                        cell_size * zoom,
-                    ),
-                )
+        # Rendering the visible part of the canves then scaling it with a single blit,
+        # transparent pixels are left with the background color
+        if col0 < col1 and row0 < row1:
+            step = max(int(1 / (cell_size * zoom)), 1)
+            view = canves.view(col0, row0, col1, row1, step)
+            view = pygame.transform.scale(
+                view, (view_right - view_left, view_bottom - view_top)
+            )
+            canves.surf.blit(view, (view_left, view_top))
 
         # ---------- Draw the grid ----------
-        color = (
-            color_table["fg_secondary"]
-            .blended(color_table["fg_primary"], min(zoom / (ZOOM_MAX), 1))
-            .rgb
-        )
+        color = Draw.grid_color(color_table, zoom)
 
         # Top & Left & Bottom & Right Borders
         pygame.draw.line(canves.surf, color, (left, top), (right, top))
@@ -361,12 +1035,12 @@ class Draw:
         )
 
         if show_grid and cell_size * zoom > UNSHOWING_THE_GRID_THRESHOLD:
-            for row in range(1, canves.h):
-                y = row * cell_size * zoom + offset.y
-                pygame.draw.line(canves.surf, color, (left, y), (right, y))
-
-            for column in range(1, canves.w):
-                offsetX = cell_size * column * zoom + offset.x
-                pygame.draw.line(canves.surf, color, (offsetX, top), (offsetX, bottom))
+            # the overlay starts at the first visible cell so panning only moves the blit
+            overlay = Draw.grid_overlay(zoom, cell_size, canves.w, canves.h, color)
+            canves.surf.blit(
+                overlay,
+                (view_left, view_top),
+                (0, 0, view_right - view_left + 1, view_bottom - view_top + 1),
+            )
 
         surf.blit(canves.surf, canves.rect)
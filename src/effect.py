@@ -1,14 +1,257 @@
+import numpy as np
+from weakref import WeakKeyDictionary
 from canvas import Canvas
 from vector import Vector
 from color import Color
+from color_table import ColorTable
+from hashlife import HashLife
+from automaton import Rule
+from parallel import Parallel
+from filters import Filter
+from static import *
+
+# The gradients the lattice corners are hashed to
+PERLIN_GRADIENTS = np.array(
+    ((1, 1), (-1, 1), (1, -1), (-1, -1), (1, 0), (-1, 0), (0, 1), (0, -1)),
+    dtype=np.float32,
+)
+
+# Shared between the fast forwards so the memoized patterns are reused
+hashlife = HashLife()
+
+
+class ActiveTiles:
+    """The tiles of a canves written to since the last step, starting with the painted ones"""
+
+    def __init__(self, canves: Canvas) -> None:
+        xs, ys = canves.painted()
+        self.tiles: set[tuple[int, int]] = set(
+            zip((xs // CANVAS_TILE_SIZE).tolist(), (ys // CANVAS_TILE_SIZE).tolist())
+        )
+
+        canves.write_hooks.append(self.written)
+
+    def written(self, canves: Canvas, tiles: set[tuple[int, int]]) -> None:
+        self.tiles.update(tiles)
+
+
+active_tiles: WeakKeyDictionary[Canvas, ActiveTiles] = WeakKeyDictionary()
 
 
 class Effect:
     @staticmethod
-    def perlin_noise(canves: Canvas, grid: Vector, seed: int = 0) -> None:
-        """Creates a 2D Perlin noise"""
+    def perlin_noise(
+        canves: Canvas,
+        grid: Vector,
+        seed: int = 0,
+        octaves: int = 1,
+        persistence: float = 0.5,
+        lacunarity: float = 2.0,
+        tiled: bool = False,
+    ) -> None:
+        """
+        Fills the canvas with a grayscale 2D Perlin noise made of octaves layers.
+
+        grid is the size in pixels of the first octave lattice cells, every next octave has lacunarity times
+        smaller cells and persistence times the amplitude of the one before it.
+
+        With tiled the noise is generated and written a row of tiles at a time instead of as one canvas sized array,
+        the noise of a pixel only depends on its position so the tiles meet seamlessly.
+        """
+
+        permutation = Effect.permutation(seed)
+        octaves_settings = (grid, permutation, octaves, persistence, lacunarity)
+
+        if not tiled:
+            if canves.w * canves.h >= PARALLEL_MIN_PIXELS:
+                Parallel.apply(
+                    canves,
+                    Effect.perlin_noise_kernel,
+                    0,
+                    grid,
+                    seed,
+                    octaves,
+                    persistence,
+                    lacunarity,
+                )
+            else:
+                canves.set_pixels(
+                    Effect.perlin_noise_pixels(
+                        0, 0, canves.w, canves.h, *octaves_settings
+                    )
+                )
+            return
+
+        # One row of tiles at a time
+        for top in range(0, canves.h, CANVAS_TILE_SIZE):
+            rect = (0, top, canves.w, min(top + CANVAS_TILE_SIZE, canves.h))
+            canves.set_rect(*rect, Effect.perlin_noise_pixels(*rect, *octaves_settings))
+
+    @staticmethod
+    def perlin_noise_kernel(
+        pixels: np.ndarray,
+        rect: tuple[int, int, int, int],
+        grid: Vector,
+        seed: int,
+        octaves: int,
+        persistence: float,
+        lacunarity: float,
+    ) -> np.ndarray:
+        """The Perlin noise of a block for Parallel.apply"""
+
+        permutation = Effect.permutation(seed)
+        return Effect.perlin_noise_pixels(
+            *rect, grid, permutation, octaves, persistence, lacunarity
+        )
+
+    @staticmethod
+    def permutation(seed: int) -> np.ndarray:
+        """A seeded shuffle of 0 to 255 repeated twice, so hashing two lattice coordinates never overflows it"""
+
+        permutation = np.random.default_rng(seed).permutation(256)
+        return np.concatenate((permutation, permutation))
+
+    @staticmethod
+    def perlin_noise_pixels(
+        left: int,
+        top: int,
+        right: int,
+        bottom: int,
+        grid: Vector,
+        permutation: np.ndarray,
+        octaves: int,
+        persistence: float,
+        lacunarity: float,
+    ) -> np.ndarray:
+        """The opaque grayscale pixels of the octaves summed noise in the given rect"""
+
+        xs = np.arange(left, right, dtype=np.float64) / grid.x
+        ys = np.arange(top, bottom, dtype=np.float64) / grid.y
+
+        noise = np.zeros((bottom - top, right - left), dtype=np.float32)
+        amplitude, frequency, total_amplitude = 1.0, 1.0, 0.0
+        for _ in range(octaves):
+            noise += amplitude * Effect.perlin(
+                xs * frequency, ys * frequency, permutation
+            )
+            total_amplitude += amplitude
+            amplitude *= persistence
+            frequency *= lacunarity
+
+        # From [-1, 1] to a gray level
+        levels = ((noise / total_amplitude + 1) * 127.5).clip(0, 255).astype(np.uint32)
+        return (levels << 24) | (levels << 16) | (levels << 8) | 0xFF
+
+    @staticmethod
+    def perlin(xs: np.ndarray, ys: np.ndarray, permutation: np.ndarray) -> np.ndarray:
+        """The Perlin noise in [-1, 1] of the grid made of the given ascending columns and rows coordinates"""
+
+        # The lattice cells the coordinates fall in and the position inside them
+        x_cells, x_counts = np.unique(np.floor(xs), return_counts=True)
+        y_cells, y_counts = np.unique(np.floor(ys), return_counts=True)
+        x_insides = (xs - np.floor(xs)).astype(np.float32)
+        y_insides = (ys - np.floor(ys)).astype(np.float32)[:, None]
+        x_cells = x_cells.astype(np.int64)
+        y_cells = y_cells.astype(np.int64)[:, None]
+
+        def corner(offsetX: int, offsetY: int) -> np.ndarray:
+            """The gradients of a lattice corner of every cell dot the offset from it"""
+
+            # Hashed once per lattice cell then repeated over the pixels inside it
+            hashes = permutation[
+                permutation[(x_cells + offsetX) & 255] + ((y_cells + offsetY) & 255)
+            ]
+            gradients = PERLIN_GRADIENTS[hashes & 7]
+            gradients = np.repeat(np.repeat(gradients, x_counts, 1), y_counts, 0)
+
+            return gradients[..., 0] * (x_insides - offsetX) + gradients[..., 1] * (
+                y_insides - offsetY
+            )
+
+        # Blending the corners with the fade curve 6t^5 - 15t^4 + 10t^3
+        x_fades = x_insides**3 * (x_insides * (x_insides * 6 - 15) + 10)
+        y_fades = y_insides**3 * (y_insides * (y_insides * 6 - 15) + 10)
+        nw = corner(0, 0)
+        north = nw + x_fades * (corner(1, 0) - nw)
+        sw = corner(0, 1)
+        south = sw + x_fades * (corner(1, 1) - sw)
+
+        return north + y_fades * (south - north)
+
+    @staticmethod
+    def apply_filters(
+        canves: Canvas, *filters: Filter, band_height: int = FILTER_BAND_HEIGHT
+    ) -> None:
+        """
+        Applies the filters one after the other to the canvas in a single pass over it.
+
+        Large canvases are split into blocks across the Parallel workers, each block read with a border
+        as wide as the filters radii sum. Smaller ones are streamed in full width bands of rows the same
+        way, so only band sized arrays are allocated. The pixels outside the canvas are the same as the
+        nearest edge pixels.
+        """
+
+        halo = sum(stage.radius for stage in filters)
+        if canves.w * canves.h >= PARALLEL_MIN_PIXELS:
+            size = (canves.w, canves.h)
+            Parallel.apply(canves, Effect.filters_kernel, halo, filters, size)
+            return
+
+        # A band must be at least as high as the border so its border never reaches the band before it
+        band_height = max(band_height, halo, 1)
+
+        def read(top: int) -> tuple[int, np.ndarray]:
+            first_row = max(top - halo, 0)
+            last_row = min(top + band_height + halo, canves.h)
+            return first_row, Filter.premultiply(
+                canves.region(0, first_row, canves.w, last_row)
+            )
+
+        band = read(0)
+        for top in range(0, canves.h, band_height):
+            bottom = min(top + band_height, canves.h)
+
+            # The next band border overlaps this band, so it's read before this band is overwritten
+            next_band = read(bottom) if bottom < canves.h else None
+
+            first_row, channels = band
+            channels = Filter.chain(
+                filters,
+                channels,
+                (0, first_row),
+                (0, top, canves.w, bottom),
+                (canves.w, canves.h),
+            )
+            canves.set_rect(0, top, canves.w, bottom, Filter.unpremultiply(channels))
+            band = next_band
+
+    @staticmethod
+    def filters_kernel(
+        pixels: np.ndarray,
+        rect: tuple[int, int, int, int],
+        filters: tuple[Filter, ...],
+        size: WH,
+    ) -> np.ndarray:
+        """The filters chain on a block for Parallel.apply, the block border is the filters radii sum wide"""
+
+        halo = sum(stage.radius for stage in filters)
+        left, top, right, bottom = rect
+        w, h = size
+
+        # Parallel.apply pads the border outside the canvas with blank pixels while the chain
+        # extends the canvas edges, so the padding is cut off
+        first_col, first_row = max(left - halo, 0), max(top - halo, 0)
+        last_col, last_row = min(right + halo, w), min(bottom + halo, h)
+        pixels = pixels[
+            first_row - top + halo : last_row - top + halo,
+            first_col - left + halo : last_col - left + halo,
+        ]
 
-        pass
+        channels = Filter.chain(
+            filters, Filter.premultiply(pixels), (first_col, first_row), rect, size
+        )
+
+        return Filter.unpremultiply(channels)
 
     @staticmethod
     def play_conway_game(canves: Canvas) -> None:
@@ -24,41 +267,134 @@ class Effect:
         3. Any alive cell with more than three alive neighbors dies (overpopulation).
         4. Any dead cell with exactly three alive neighbors becomes alive (reproduction).
 
+        A new cell takes the average color of its alive neighbors.
         The canvas is updated in-place to reflect the new state after applying these rules.
         """
 
-        # next_generation_pixels = deepcopy(canves.pixels)
-        next_generation_pixels = canves.pixels.copy()
-
-        for y in range(canves.h):
-            for x in range(canves.w):
-                is_alive = canves.get_at((x, y)) != Color.NULL_VALUE
-                num_alive_neighbors = 0
-                new_cell_color = Color(0)
-                for offsetX in range(-1, 2):
-                    for offsetY in range(-1, 2):
-                        if not canves.is_inside(
-                            (x + offsetX, y + offsetY)
-                        ):  # not checking cells outside the canvas
-                            continue
-
-                        if offsetX == 0 and offsetY == 0:  # excluding the cell it self
-                            continue
-
-                        color = canves.get_at((x + offsetX, y + offsetY))
-                        if color != Color.NULL_VALUE:
-                            new_cell_color.blend(color, 0.5)
-                            num_alive_neighbors += 1
-
-                if is_alive:
-                    if num_alive_neighbors < 2:  # underpopulation
-                        next_generation_pixels[y, x] = Color.NULL_VALUE
-                    elif num_alive_neighbors > 3:  # overpopulation
-                        next_generation_pixels[y, x] = Color.NULL_VALUE
-                    elif num_alive_neighbors in {2, 3}:
-                        pass
-                else:
-                    if num_alive_neighbors == 3:
-                        next_generation_pixels[y, x] = new_cell_color
-
-        canves.pixels = next_generation_pixels
+        Effect.play_automaton(canves, CONWAY_RULE)
+
+    @staticmethod
+    def play_automaton(canves: Canvas, rulestring: str) -> None:
+        """
+        Simulates one step of the cellular automaton of the rulestring on the canvas.
+
+        Supports the B/S rulestrings ("B36/S23" or "23/36"), Generations ("B2/S/C3" or "/2/3")
+        and Larger than Life ("R5,C0,M1,S34..58,B34..45,NM"), see automaton.Rule for how the cells are read.
+
+        Only the tiles that changed since the last step and the tiles around them are simulated,
+        since the rest of the tiles can't change, so a step costs as much as the active area.
+        """
+
+        rule = Rule.compile(rulestring)
+        r = rule.radius
+
+        tracker = active_tiles.get(canves)
+        if tracker is None:
+            tracker = active_tiles[canves] = ActiveTiles(canves)
+
+        # The changes of this step are collected by the tracker for the next one
+        changed, tracker.tiles = tracker.tiles, set()
+        cols = -(-canves.w // CANVAS_TILE_SIZE)
+        rows = -(-canves.h // CANVAS_TILE_SIZE)
+        reach = -(-r // CANVAS_TILE_SIZE)  # how many tiles away a change can be seen
+        tiles = {
+            (tx + offsetX, ty + offsetY)
+            for tx, ty in changed
+            for offsetY in range(-reach, reach + 1)
+            for offsetX in range(-reach, reach + 1)
+            if 0 <= tx + offsetX < cols and 0 <= ty + offsetY < rows
+        }
+
+        if not tiles:
+            return
+
+        # Stepping the whole board at once is cheaper when most of it is active
+        if len(tiles) * 2 > cols * rows:
+            if canves.w * canves.h >= PARALLEL_MIN_PIXELS:
+                Parallel.apply(canves, Effect.automaton_kernel, r, rulestring)
+            else:
+                pixels = canves.region(0, 0, canves.w, canves.h)
+                canves.set_pixels(rule.step(np.pad(pixels, r)))
+            return
+
+        next_generation: list[tuple[tuple[int, int, int, int], np.ndarray]] = []
+        for tile in tiles:
+            left, top, right, bottom = rect = canves.tile_rect(tile)
+
+            # The tile with a border of its neighbors, cells outside the canves are dead
+            border_left, border_right = max(left - r, 0), min(right + r, canves.w)
+            border_top, border_bottom = max(top - r, 0), min(bottom + r, canves.h)
+            pixels = canves.region(border_left, border_top, border_right, border_bottom)
+            pixels = np.pad(
+                pixels,
+                (
+                    (r - (top - border_top), r - (border_bottom - bottom)),
+                    (r - (left - border_left), r - (border_right - right)),
+                ),
+            )
+
+            next_pixels = rule.step(pixels)
+            if (next_pixels != pixels[r:-r, r:-r]).any():
+                next_generation.append((rect, next_pixels))
+
+        # Writing after all the tiles are simulated so every tile sees the same generation
+        for rect, next_pixels in next_generation:
+            canves.set_rect(*rect, next_pixels)
+
+    @staticmethod
+    def automaton_kernel(
+        pixels: np.ndarray, rect: tuple[int, int, int, int], rulestring: str
+    ) -> np.ndarray:
+        """One step of the rule on a block for Parallel.apply, the block border is the rule radius wide"""
+
+        return Rule.compile(rulestring).step(pixels)
+
+    @staticmethod
+    def fast_forward_conway(
+        canves: Canvas, generations: int, color: int = ColorTable.WHITE
+    ) -> None:
+        """
+        Advances the Game of Life on the canvas by the given generations at once using HashLife.
+
+        While fast forwarding the board is unbounded, the cells that end up outside of the canvas are dropped.
+        The cells alive before and after keep their color, the rest of the alive cells get the given color.
+        """
+
+        xs, ys = canves.painted()
+        Effect.write_generation(
+            canves, xs, ys, *Effect.fast_forward_cells(xs, ys, generations), color
+        )
+
+    @staticmethod
+    def fast_forward_cells(
+        xs: np.ndarray, ys: np.ndarray, generations: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """The (xs, ys) of the alive cells after the given generations, on the HashLife of the calling process"""
+
+        node, origin = hashlife.advance(*hashlife.from_cells(xs, ys), generations)
+        return hashlife.to_cells(node, origin)
+
+    @staticmethod
+    def write_generation(
+        canves: Canvas,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        new_xs: np.ndarray,
+        new_ys: np.ndarray,
+        color: int = ColorTable.WHITE,
+    ) -> None:
+        """Writes the cells that changed from the alive cells (xs, ys) to (new_xs, new_ys), see fast_forward_conway"""
+
+        # Writing only the cells that changed, keyed by their index in the canvas
+        inside = (
+            (new_xs >= 0) & (new_xs < canves.w) & (new_ys >= 0) & (new_ys < canves.h)
+        )
+        before = ys * canves.w + xs
+        after = new_ys[inside] * canves.w + new_xs[inside]
+
+        died = np.setdiff1d(before, after)
+        born = np.setdiff1d(after, before)
+        canves.set_many(
+            died % canves.w, died // canves.w, Color.int_to_tuple(Color.NULL_VALUE)
+        )
+        canves.set_many(born % canves.w, born // canves.w, Color.int_to_tuple(color))
@@ -0,0 +1,193 @@
+import numpy as np
+from color import Color
+from static import *
+
+
+class Filter:
+    """
+    A filter of the premultiplied RGBA channels of the pixels.
+
+    apply gets float32 channels of shape (h + 2 * radius, w + 2 * radius, 4) and returns the (h, w, 4)
+    filtered channels of the inside, so chained filters only need the sum of their radii as a border.
+    """
+
+    radius: int = 0
+
+    def apply(self, channels: np.ndarray) -> np.ndarray: ...
+
+    @staticmethod
+    def premultiply(pixels: np.ndarray) -> np.ndarray:
+        """The float32 (..., 4) channels of the packed pixels with the color multiplied by the alpha"""
+
+        channels = Color.ints_to_array(pixels).astype(np.float32)
+        channels[..., :3] *= channels[..., 3:] / 0xFF
+
+        return channels
+
+    @staticmethod
+    def unpremultiply(channels: np.ndarray) -> np.ndarray:
+        """The packed pixels of the premultiplied channels"""
+
+        channels = np.clip(channels, 0, 0xFF)
+        alpha = channels[..., 3:]
+        channels[..., :3] = np.divide(
+            channels[..., :3] * 0xFF,
+            alpha,
+            out=np.zeros_like(channels[..., :3]),
+            where=alpha > 0,
+        )
+
+        return Color.array_to_ints(np.rint(np.minimum(channels, 0xFF)))
+
+    @staticmethod
+    def chain(
+        filters: Sequence["Filter"],
+        channels: np.ndarray,
+        origin: XY,
+        rect: tuple[int, int, int, int],
+        size: WH,
+    ) -> np.ndarray:
+        """
+        Applies the filters one after the other to the (left, top, right, bottom) rect of a board of the given size.
+
+        The channels are the pixels of the board starting at the (left, top) origin, and they have to
+        reach sum of the radii pixels around the rect, or the board edge. Every filter only computes the
+        pixels the filters after it still need, and the board edges are extended for each filter, so the
+        result is the same as running the chain on the whole board at once (separate passes would also
+        round the pixels between the filters).
+        """
+
+        left, top, right, bottom = rect
+        first_col, first_row = origin
+        w, h = size
+
+        remaining = sum(stage.radius for stage in filters)
+        for stage in filters:
+            r = stage.radius
+            remaining -= r
+
+            # The pixels this filter computes and the pixels it reads for them
+            out_left, out_right = max(left - remaining, 0), min(right + remaining, w)
+            out_top, out_bottom = max(top - remaining, 0), min(bottom + remaining, h)
+            in_left, in_right = out_left - r, out_right + r
+            in_top, in_bottom = out_top - r, out_bottom + r
+
+            block = channels[
+                max(in_top, 0) - first_row : min(in_bottom, h) - first_row,
+                max(in_left, 0) - first_col : min(in_right, w) - first_col,
+            ]
+            block = np.pad(
+                block,
+                (
+                    (max(-in_top, 0), max(in_bottom - h, 0)),
+                    (max(-in_left, 0), max(in_right - w, 0)),
+                    (0, 0),
+                ),
+                mode="edge",
+            )
+
+            channels = stage.apply(block)
+            first_col, first_row = out_left, out_top
+
+        return channels[
+            top - first_row : bottom - first_row, left - first_col : right - first_col
+        ]
+
+
+class Convolution(Filter):
+    """
+    A convolution of every channel with a kernel.
+
+    The kernel is either a square 2D array, or a pair of 1D arrays (vertical, horizontal) of a
+    separable kernel which is applied as two 1D passes.
+    """
+
+    def __init__(self, kernel: np.ndarray | tuple[np.ndarray, np.ndarray]) -> None:
+        if isinstance(kernel, tuple):
+            self.kernel = tuple(np.asarray(k, dtype=np.float32) for k in kernel)
+            self.radius = len(self.kernel[0]) // 2
+        else:
+            self.kernel = np.asarray(kernel, dtype=np.float32)
+            self.radius = self.kernel.shape[0] // 2
+
+    def apply(self, channels: np.ndarray) -> np.ndarray:
+        if isinstance(self.kernel, tuple):
+            vertical, horizontal = self.kernel
+            channels = Convolution.pass_1d(channels, vertical, 0)
+            return Convolution.pass_1d(channels, horizontal, 1)
+
+        r = self.radius
+        h, w = channels.shape[0] - 2 * r, channels.shape[1] - 2 * r
+        result = np.zeros((h, w, 4), dtype=np.float32)
+        for (offsetY, offsetX), weight in np.ndenumerate(self.kernel):
+            if weight:
+                result += (
+                    weight * channels[offsetY : offsetY + h, offsetX : offsetX + w]
+                )
+
+        return result
+
+    @staticmethod
+    def pass_1d(channels: np.ndarray, kernel: np.ndarray, axis: int) -> np.ndarray:
+        """The channels convolved along the axis, the result is len(kernel) - 1 shorter on it"""
+
+        length = channels.shape[axis] - len(kernel) + 1
+        shape = list(channels.shape)
+        shape[axis] = length
+        result = np.zeros(shape, dtype=np.float32)
+        window = [slice(None)] * channels.ndim
+        for offset, weight in enumerate(kernel):
+            if weight:
+                window[axis] = slice(offset, offset + length)
+                result += weight * channels[tuple(window)]
+
+        return result
+
+    @staticmethod
+    def box(radius: int) -> "Convolution":
+        """Averages every pixel with its neighbors in a 2 * radius + 1 wide square"""
+
+        kernel = np.full(2 * radius + 1, 1 / (2 * radius + 1))
+        return Convolution((kernel, kernel))
+
+    @staticmethod
+    def gaussian(sigma: float, radius: int | None = None) -> "Convolution":
+        """A Gaussian blur, cut 3 sigmas away from the center by default"""
+
+        if radius is None:
+            radius = max(int(np.ceil(3 * sigma)), 1)
+
+        kernel = np.exp(-(np.arange(-radius, radius + 1) ** 2) / (2 * sigma**2))
+        kernel /= kernel.sum()
+        return Convolution((kernel, kernel))
+
+    @staticmethod
+    def sharpen(amount: float = 1.0) -> "Convolution":
+        """Pushes every pixel away from the average of its 4 direct neighbors"""
+
+        return Convolution(
+            [
+                [0, -amount, 0],
+                [-amount, 1 + 4 * amount, -amount],
+                [0, -amount, 0],
+            ]
+        )
+
+
+class Sobel(Filter):
+    """The gradient magnitude of every color channel, the alpha is kept"""
+
+    radius = 1
+
+    def __init__(self) -> None:
+        # The Sobel kernels are separable into a smoothing and a derivative
+        self.horizontal = Convolution(([1, 2, 1], [-1, 0, 1]))
+        self.vertical = Convolution(([-1, 0, 1], [1, 2, 1]))
+
+    def apply(self, channels: np.ndarray) -> np.ndarray:
+        result = np.hypot(
+            self.horizontal.apply(channels), self.vertical.apply(channels)
+        )
+        result[..., 3] = channels[1:-1, 1:-1, 3]
+
+        return result
@@ -0,0 +1,262 @@
+import numpy as np
+from itertools import islice
+from static import *
+
+
+class Node:
+    """A square of 2^level cells split into four quadrants, nodes are shared so identical squares are the same node"""
+
+    __slots__ = ("level", "nw", "ne", "sw", "se", "population")
+
+    def __init__(
+        self,
+        level: int,
+        nw: "Node | None" = None,
+        ne: "Node | None" = None,
+        sw: "Node | None" = None,
+        se: "Node | None" = None,
+        population: int = 0,
+    ) -> None:
+        self.level = level
+        self.nw = nw
+        self.ne = ne
+        self.sw = sw
+        self.se = se
+        self.population = population
+
+
+# The two cells every node is made of
+DEAD = Node(0, population=0)
+ALIVE = Node(0, population=1)
+
+
+class HashLife:
+    """
+    Conway's Game of Life on an unbounded board using Gosper's HashLife.
+
+    The board is a quadtree of shared nodes and the result of advancing each node is memoized,
+    so repetitive patterns can jump 2^k generations in one call. The older half of both caches is
+    dropped whenever they hold more than cache_size entries, even in the middle of a call.
+    """
+
+    def __init__(self, cache_size: int = HASHLIFE_CACHE_SIZE) -> None:
+        self.cache_size = cache_size
+        self.nodes: dict[tuple[Node, Node, Node, Node], Node] = {}
+        self.results: dict[tuple[Node, int], Node] = {}
+        self.empty_nodes: list[Node] = [DEAD]
+
+    def evict(self) -> None:
+        """Drops the older half of the caches if they got too big, the nodes in use stay valid"""
+
+        if len(self.nodes) + len(self.results) <= self.cache_size:
+            return
+
+        for cache in (self.nodes, self.results):
+            for key in list(islice(cache, len(cache) // 2)):
+                del cache[key]
+
+    def join(self, nw: Node, ne: Node, sw: Node, se: Node) -> Node:
+        """The node made of the four given quadrants"""
+
+        key = (nw, ne, sw, se)
+        node = self.nodes.get(key)
+        if node is None:
+            population = nw.population + ne.population + sw.population + se.population
+            node = self.nodes[key] = Node(nw.level + 1, nw, ne, sw, se, population)
+            self.evict()
+
+        return node
+
+    def empty(self, level: int) -> Node:
+        while len(self.empty_nodes) <= level:
+            e = self.empty_nodes[-1]
+            self.empty_nodes.append(self.join(e, e, e, e))
+
+        return self.empty_nodes[level]
+
+    def centre(self, node: Node) -> Node:
+        """The node one level up with the given node in its center"""
+
+        e = self.empty(node.level - 1)
+
+        return self.join(
+            self.join(e, e, e, node.nw),
+            self.join(e, e, node.ne, e),
+            self.join(e, node.sw, e, e),
+            self.join(node.se, e, e, e),
+        )
+
+    def inner(self, node: Node) -> Node:
+        """The node one level down at the center of the given node"""
+
+        return self.join(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+    def life(self, cells: tuple[Node, ...]) -> Node:
+        """The next state of the center cell of a 3x3 neighborhood"""
+
+        neighbors = sum(cell.population for cell in cells) - cells[4].population
+        if neighbors == 3 or (neighbors == 2 and cells[4].population):
+            return ALIVE
+
+        return DEAD
+
+    def life_4x4(self, node: Node) -> Node:
+        """The center 2x2 of a 4x4 node after one generation"""
+
+        rows = (
+            (node.nw.nw, node.nw.ne, node.ne.nw, node.ne.ne),
+            (node.nw.sw, node.nw.se, node.ne.sw, node.ne.se),
+            (node.sw.nw, node.sw.ne, node.se.nw, node.se.ne),
+            (node.sw.sw, node.sw.se, node.se.sw, node.se.se),
+        )
+        quadrants = [
+            self.life(
+                tuple(rows[row + dy][col + dx] for dy in range(3) for dx in range(3))
+            )
+            for row, col in ((0, 0), (0, 1), (1, 0), (1, 1))
+        ]
+
+        return self.join(*quadrants)
+
+    def successor(self, node: Node, j: int) -> Node:
+        """The center of the node (one level down) after 2^j generations, j can't exceed level - 2"""
+
+        if node.population == 0:
+            return node.nw
+
+        key = (node, j)
+        result = self.results.get(key)
+        if result is not None:
+            return result
+
+        if node.level == 2:
+            result = self.life_4x4(node)
+        else:
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+
+            # The 9 overlapping sub-squares one level down, each advanced by up to half of the generations
+            step = min(j, node.level - 3)
+            c = [
+                [self.successor(self.join(*q), step) for q in row]
+                for row in (
+                    (
+                        (nw.nw, nw.ne, nw.sw, nw.se),
+                        (nw.ne, ne.nw, nw.se, ne.sw),
+                        (ne.nw, ne.ne, ne.sw, ne.se),
+                    ),
+                    (
+                        (nw.sw, nw.se, sw.nw, sw.ne),
+                        (nw.se, ne.sw, sw.ne, se.nw),
+                        (ne.sw, ne.se, se.nw, se.ne),
+                    ),
+                    (
+                        (sw.nw, sw.ne, sw.sw, sw.se),
+                        (sw.ne, se.nw, sw.se, se.sw),
+                        (se.nw, se.ne, se.sw, se.se),
+                    ),
+                )
+            ]
+
+            quadrants = []
+            for row, col in ((0, 0), (0, 1), (1, 0), (1, 1)):
+                square = self.join(
+                    c[row][col], c[row][col + 1], c[row + 1][col], c[row + 1][col + 1]
+                )
+                # The remaining generations when the sub-squares were advanced by less than all of them
+                if j == node.level - 2:
+                    quadrants.append(self.successor(square, j - 1))
+                else:
+                    quadrants.append(self.inner(square))
+
+            result = self.join(*quadrants)
+
+        self.results[key] = result
+        self.evict()
+
+        return result
+
+    def advance(self, node: Node, origin: XY, generations: int) -> tuple[Node, XY]:
+        """Advances the node with its topleft at origin, returns the new node and its origin"""
+
+        x, y = origin
+        j = 0
+
+        while generations:
+            if generations & 1:
+                # Making room for the pattern to grow by 2^j cells on every side
+                while node.level < j + 1:
+                    node = self.centre(node)
+                    x, y = x - (1 << (node.level - 2)), y - (1 << (node.level - 2))
+                for _ in range(2):
+                    node = self.centre(node)
+                    x, y = x - (1 << (node.level - 2)), y - (1 << (node.level - 2))
+
+                node = self.successor(node, j)
+                x, y = x + (1 << (node.level - 1)), y + (1 << (node.level - 1))
+
+                node, (x, y) = self.crop(node, (x, y))
+
+            generations >>= 1
+            j += 1
+
+        return node, (x, y)
+
+    def crop(self, node: Node, origin: XY) -> tuple[Node, XY]:
+        """Shrinks the node while all of its cells are in its center"""
+
+        x, y = origin
+
+        while node.level > 2 and self.inner(node).population == node.population:
+            node = self.inner(node)
+            x, y = x + (1 << (node.level - 1)), y + (1 << (node.level - 1))
+
+        return node, (x, y)
+
+    def from_cells(self, xs: np.ndarray, ys: np.ndarray) -> tuple[Node, XY]:
+        """Builds the node holding the given alive cells, returns it with its origin"""
+
+        if not len(xs):
+            return self.empty(2), (0, 0)
+
+        x0, y0 = int(xs.min()), int(ys.min())
+        size = max(int(xs.max()) - x0, int(ys.max()) - y0) + 1
+        level = max(int(size - 1).bit_length(), 2)
+
+        # Building the tree bottom up, only the squares with alive cells are kept at each level
+        squares: dict[tuple[int, int], Node] = {
+            (int(x) - x0, int(y) - y0): ALIVE for x, y in zip(xs, ys)
+        }
+        for lvl in range(level):
+            e = self.empty(lvl)
+            parents: dict[tuple[int, int], list[Node]] = {}
+            for (x, y), square in squares.items():
+                quadrants = parents.setdefault((x >> 1, y >> 1), [e, e, e, e])
+                quadrants[(y & 1) * 2 + (x & 1)] = square
+
+            squares = {pos: self.join(*quadrants) for pos, quadrants in parents.items()}
+
+        return squares[(0, 0)], (x0, y0)
+
+    def to_cells(self, node: Node, origin: XY) -> tuple[np.ndarray, np.ndarray]:
+        """The (xs, ys) of the alive cells in the node with its topleft at origin"""
+
+        xs, ys = [], []
+        stack = [(node, *origin)]
+
+        while stack:
+            node, x, y = stack.pop()
+            if not node.population:
+                continue
+
+            if node.level == 0:
+                xs.append(x)
+                ys.append(y)
+                continue
+
+            half = 1 << (node.level - 1)
+            stack.append((node.nw, x, y))
+            stack.append((node.ne, x + half, y))
+            stack.append((node.sw, x, y + half))
+            stack.append((node.se, x + half, y + half))
+
+        return np.array(xs, dtype=np.int64), np.array(ys, dtype=np.int64)
@@ -0,0 +1,147 @@
+import zlib
+import numpy as np
+from collections import deque
+from canvas import Canvas
+from static import *
+
+# tile: (the compressed pixels of the tile, the tile shape)
+type TileSnapshots = dict[tuple[int, int], tuple[bytes, tuple[int, int]]]
+
+
+class History:
+    """
+    Undo and redo for a canves that only keeps the tiles each operation wrote to.
+
+    A tile is compressed the first time it gets written to during an operation (copy on write). The oldest
+    entries are dropped as soon as all of the entries with the operation in progress take more than the
+    memory budget, and an operation that doesn't fit in the budget on its own can't be undone.
+    """
+
+    def __init__(self, canves: Canvas, budget: int = HISTORY_MEMORY_BUDGET) -> None:
+        self.canves = canves
+        self.budget = budget
+        self.undo_stack: deque[TileSnapshots] = deque()
+        self.redo_stack: deque[TileSnapshots] = deque()
+        # The bytes taken by the compressed tiles in both stacks and in pending
+        self.size = 0
+
+        # The compressed tiles of the operation in progress before it wrote to them
+        self.pending: TileSnapshots = {}
+        self.overflowed = False  # the operation in progress outgrew the budget
+        self.restoring = False
+
+        canves.write_hooks.append(self.save_tiles)
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self.undo_stack or self.pending)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self.redo_stack)
+
+    def save_tiles(self, canves: Canvas, tiles: set[tuple[int, int]]) -> None:
+        """The canves write hook, copies the tiles that hasn't been written to yet in this operation"""
+
+        if self.restoring or self.overflowed:
+            return
+
+        # A new operation makes the undone ones unreachable
+        if not self.pending:
+            while self.redo_stack:
+                self.size -= History.entry_size(self.redo_stack.pop())
+
+        for tile in tiles:
+            if tile in self.pending:
+                continue
+
+            pixels = canves.region(*canves.tile_rect(tile))
+            self.pending[tile] = (zlib.compress(pixels.tobytes(), 1), pixels.shape)
+            self.size += len(self.pending[tile][0])
+
+            self.trim()
+            if self.size > self.budget:
+                self.size -= History.entry_size(self.pending)
+                self.pending.clear()
+                self.overflowed = True
+                return
+
+    def commit(self) -> None:
+        """Ends the operation in progress, everything written since the last commit is undone at once"""
+
+        self.overflowed = False
+        if not self.pending:
+            return
+
+        self.undo_stack.append(self.pending)
+        self.pending = {}
+
+    def undo(self) -> bool:
+        """Restores the tiles of the last operation, returns False if there is nothing to undo"""
+
+        self.commit()
+        if not self.undo_stack:
+            return False
+
+        entry = self.undo_stack.pop()
+        self.size -= History.entry_size(entry)
+
+        self.redo_stack.append(self.restore(entry))
+        self.size += History.entry_size(self.redo_stack[-1])
+        self.trim()
+
+        return True
+
+    def redo(self) -> bool:
+        """Re-applies the last undone operation, returns False if there is nothing to redo"""
+
+        self.commit()
+        if not self.redo_stack:
+            return False
+
+        entry = self.redo_stack.pop()
+        self.size -= History.entry_size(entry)
+
+        self.undo_stack.append(self.restore(entry))
+        self.size += History.entry_size(self.undo_stack[-1])
+        self.trim()
+
+        return True
+
+    def clear(self) -> None:
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.pending.clear()
+        self.overflowed = False
+        self.size = 0
+
+    def restore(self, entry: TileSnapshots) -> TileSnapshots:
+        """Writes the entry tiles back to the canves and returns the tiles as they were before"""
+
+        current = {}
+        self.restoring = True
+
+        for tile, (data, shape) in entry.items():
+            left, top, right, bottom = self.canves.tile_rect(tile)
+            pixels = self.canves.region(left, top, right, bottom)
+            current[tile] = (zlib.compress(pixels.tobytes(), 1), pixels.shape)
+
+            pixels = np.frombuffer(zlib.decompress(data), dtype=np.uint32)
+            self.canves.set_rect(left, top, right, bottom, pixels.reshape(shape))
+
+        self.restoring = False
+
+        return current
+
+    def trim(self) -> None:
+        """Drops the oldest entries until the history fits in the memory budget, the pending tiles are kept"""
+
+        while self.size > self.budget and self.undo_stack:
+            self.size -= History.entry_size(self.undo_stack.popleft())
+
+        while self.size > self.budget and self.redo_stack:
+            self.size -= History.entry_size(self.redo_stack.popleft())
+
+    @staticmethod
+    def entry_size(entry: TileSnapshots) -> int:
+        return sum(len(data) for data, _ in entry.values())
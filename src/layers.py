@@ -0,0 +1,186 @@
+import numpy as np
+from canvas import Canvas
+from color import Color
+from static import *
+
+
+class Layer:
+    def __init__(
+        self,
+        canves: Canvas,
+        name: str,
+        visible: bool = True,
+        opacity: float = 1.0,
+        blend_mode: BlendMode = "normal",
+    ) -> None:
+        self.canves = canves
+        self.name = name
+        self.visible = visible
+        self.opacity = opacity
+        self.blend_mode = blend_mode
+
+
+class LayerStack(Canvas):
+    """
+    An ordered stack of layers (bottom to top) flattened into the pixels of the stack itself.
+
+    Drawing happens on the layers canveses, the stack only recomposites the tiles they wrote to and keeps the
+    result between frames. The layers below and above the active one are kept flattened too, so editing the
+    active layer blends three planes no matter how many layers there are (as long as the layers above it use
+    the normal blend mode). The planes are kept premultiplied in float32 so the pixels are rounded only once,
+    which stays within one step of each channel of blending the whole stack directly.
+    """
+
+    def __init__(self, size: WH = WINDOW_SIZE) -> None:
+        super().__init__(size)
+        self.layers: list[Layer] = []
+        self.active = 0
+
+        self.below = np.zeros((self.h, self.w, 4), dtype=np.float32)
+        self.above = np.zeros((self.h, self.w, 4), dtype=np.float32)
+
+        # The tiles that has to be recomposited in the flattened pixels, below and above planes
+        self.stale: set[tuple[int, int]] = set()
+        self.stale_below: set[tuple[int, int]] = set()
+        self.stale_above: set[tuple[int, int]] = set()
+
+    @property
+    def active_layer(self) -> Layer:
+        return self.layers[self.active]
+
+    def add_layer(self, name: str, index: int | None = None, **kwargs) -> Canvas:
+        """Adds an empty layer on top or at the given index and returns its canves"""
+
+        canves = Canvas((self.w, self.h))
+        canves.write_hooks.append(self.layer_written)
+
+        index = len(self.layers) if index is None else index
+        self.layers.insert(index, Layer(canves, name, **kwargs))
+        if index <= self.active and len(self.layers) > 1:
+            self.active += 1
+
+        self.invalidate()
+
+        return canves
+
+    def remove_layer(self, index: int) -> None:
+        layer = self.layers.pop(index)
+        layer.canves.write_hooks.remove(self.layer_written)
+
+        if index < self.active or self.active == len(self.layers):
+            self.active = max(self.active - 1, 0)
+
+        self.invalidate()
+
+    def move_layer(self, index: int, new_index: int) -> None:
+        active_layer = self.active_layer
+        self.layers.insert(new_index, self.layers.pop(index))
+        self.active = self.layers.index(active_layer)
+
+        self.invalidate()
+
+    def set_active(self, index: int) -> None:
+        self.active = index
+        self.invalidate()
+
+    def set_visible(self, index: int, visible: bool) -> None:
+        self.layers[index].visible = visible
+        self.invalidate()
+
+    def set_opacity(self, index: int, opacity: float) -> None:
+        self.layers[index].opacity = opacity
+        self.invalidate()
+
+    def set_blend_mode(self, index: int, blend_mode: BlendMode) -> None:
+        self.layers[index].blend_mode = blend_mode
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Recomposite everything, for when the layers order or properties change"""
+
+        tiles = set(self.tiles_in(0, 0, self.w, self.h))
+        self.stale.update(tiles)
+        self.stale_below.update(tiles)
+        self.stale_above.update(tiles)
+
+    def layer_written(self, canves: Canvas, tiles: set[tuple[int, int]]) -> None:
+        """The write hook of the layers canveses"""
+
+        self.stale.update(tiles)
+
+        index = next(i for i, layer in enumerate(self.layers) if layer.canves is canves)
+        if index < self.active:
+            self.stale_below.update(tiles)
+        elif index > self.active:
+            self.stale_above.update(tiles)
+
+    def composite(
+        self,
+        layers: list[Layer],
+        rect: tuple[int, int, int, int],
+        channels: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """Blends the visible layers over the given premultiplied channels (transparent by default) inside the rect"""
+
+        left, top, right, bottom = rect
+        if channels is None:
+            channels = np.zeros((bottom - top, right - left, 4), dtype=np.float32)
+
+        for layer in layers:
+            if layer.visible and layer.opacity > 0:
+                channels = Color.over_premultiplied(
+                    channels,
+                    Color.premultiply(layer.canves.region(left, top, right, bottom)),
+                    layer.opacity,
+                    layer.blend_mode,
+                )
+
+        return channels
+
+    def flatten(self) -> None:
+        """Recomposites the stale tiles into the pixels of the stack"""
+
+        if not self.stale or not self.layers:
+            return
+
+        below_layers = self.layers[: self.active]
+        above_layers = self.layers[self.active + 1 :]
+        # The other blend modes depends on what is under them so the above layers can't be flattened ahead
+        above_flattened = all(
+            layer.blend_mode == "normal" for layer in above_layers if layer.visible
+        )
+
+        for tile in self.stale:
+            left, top, right, bottom = rect = self.tile_rect(tile)
+
+            if tile in self.stale_below:
+                self.below[top:bottom, left:right] = self.composite(below_layers, rect)
+            if above_flattened and tile in self.stale_above:
+                self.above[top:bottom, left:right] = self.composite(above_layers, rect)
+
+            channels = self.composite(
+                [self.active_layer], rect, self.below[top:bottom, left:right]
+            )
+            if above_flattened:
+                channels = Color.over_premultiplied(
+                    channels, self.above[top:bottom, left:right]
+                )
+            else:
+                channels = self.composite(above_layers, rect, channels)
+
+            self.touch((tile,))
+            self.pixels[top:bottom, left:right] = Color.unpremultiply(channels)
+
+        self.stale_below.difference_update(self.stale)
+        if above_flattened:
+            self.stale_above.difference_update(self.stale)
+        self.stale.clear()
+
+    def view(
+        self, left: int, top: int, right: int, bottom: int, step: int = 1
+    ) -> pygame.Surface:
+        """Renders the flattened layers, see Canvas.view"""
+
+        self.flatten()
+
+        return super().view(left, top, right, bottom, step)
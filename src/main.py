@@ -1,11 +1,16 @@
 import pygame
+import numpy as np
+from concurrent.futures import Future
 from functools import partial
 from flatten_dict import flatten
 from app_context import AppContext
 from canvas import Canvas
+from layers import LayerStack
 from camera import Camera
 from draw import Draw
 from effect import Effect
+from parallel import Parallel
+from history import History
 from timer import Timer
 from font_table import FontTable
 from color_table import ColorTable
@@ -35,6 +40,8 @@ Keys:
     - Ctrl + S                    : Save canvas as BMP
     - Ctrl + R                    : Recenter (offset -> (0,0), zoom -> 100%)
     - Ctrl + Delete               : Clear all pixels
+    - Ctrl + Z                    : Undo
+    - Ctrl + Y                    : Redo
     - Ctrl + Shift + M            : Toggle mouse position in status bar
     - Ctrl + Shift + G            : Toggle grid size in status bar
     - Ctrl + Shift + Z            : Toggle zoom percentage in status bar
@@ -44,11 +51,13 @@ Keys:
     - Ctrl + Shift + K            : Toggle markers in status bar
     - Ctrl + Shift + R            : Toggle ruler in status bar
     - Ctrl + Shift + Alt + C      : Start/Stop Conway game
+    - Ctrl + Shift + Alt + F      : Toggle Conway fast forward (CONWAY_FAST_FORWARD_GENERATIONS per step, on a worker process)
+    - Ctrl + Shift + Alt + N      : Next automaton rule (AUTOMATON_RULES), shown in the caption
 
 Tools (usage summary):
     - Circle   : LMB -> unfilled, RMB -> filled (radius +/-)
-    - Curve    : LMB -> add point
-    - Fill     : LMB -> fill
+    - Curve    : LMB -> add or drag point, RMB -> draw, Ctrl -> fill, MMB -> bezier / catmull-rom
+    - Fill     : LMB -> fill, Ctrl -> replace the color everywhere
     - Line     : LMB -> set A, release -> set B
     - Pincil   : LMB + move -> draw
     - Rectangle: LMB -> set A, release -> set B
@@ -75,19 +84,28 @@ class DrawingCanvas:
         self.init_font_table()
         self.init_color_table()
 
-        self.canvas = Canvas((100, 100))
+        self.layers = LayerStack((100, 100))
+        self.canvas = self.layers.add_layer("background")
         self.camera = Camera(self.canvas)
+        self.history = History(self.canvas)
         self.input_manager = InputManager()
         self.hotkey_manager = HotkeyManager()
         self.tool_manager = ToolManager()
         self.debugging_tool = DebuggingTool(self.color_table)
-        self.conway_timer = Timer(
-            partial(Effect.play_conway_game, self.canvas), 0.2, False
-        )
+        self.conway_timer = Timer(self.conway_step, 0.2, False)
+        # per timer tick, more than one fast forwards with HashLife
+        self.conway_generations = 1
+        self.automaton_rule = CONWAY_RULE
+        # The running HashLife fast forward with the alive cells it started from and the
+        # canvas writes count then, its result is dropped if the canvas changed meanwhile
+        self.fast_forward: tuple[Future, np.ndarray, np.ndarray, int] | None = None
+        self.canvas_writes = 0
+        self.canvas.write_hooks.append(self.canvas_written)
         self._fps_timer = 0
 
         # Fill context
         self.ctx.canves = self.canvas
+        self.ctx.layers = self.layers
         self.ctx.camera = self.camera
         self.ctx.font_table = self.font_table
         self.ctx.color_table = self.color_table
@@ -157,8 +175,14 @@ class DrawingCanvas:
                 partial(self.toggle_statusbar_info, info_name=info_name),
             )
         self.hotkey_manager.register_action("canves.clear", self.canves_clear)
+        self.hotkey_manager.register_action("history.undo", self.history_undo)
+        self.hotkey_manager.register_action("history.redo", self.history_redo)
         self.hotkey_manager.register_action("output.save_as_bmp", lambda ctx: None)
         self.hotkey_manager.register_action("conway_play", self.toggle_conway_game)
+        self.hotkey_manager.register_action(
+            "conway_fast_forward", self.toggle_conway_fast_forward
+        )
+        self.hotkey_manager.register_action("automaton_rule", self.cycle_automaton_rule)
 
     def register_hotkey_bindings(self) -> None:
         for binding in flatten(HOTKEYS):
@@ -201,12 +225,69 @@ class DrawingCanvas:
     def canves_clear(self, ctx: AppContext) -> None:
         self.canvas.reset_pixels()
 
+    def history_undo(self, ctx: AppContext) -> None:
+        self.history.undo()
+
+    def history_redo(self, ctx: AppContext) -> None:
+        self.history.redo()
+
     def toggle_conway_game(self, ctx: AppContext) -> None:
         if self.conway_timer.is_running:
             self.conway_timer.stop()
+            self.cancel_fast_forward()
         else:
             self.conway_timer.start()
 
+    def toggle_conway_fast_forward(self, ctx: AppContext) -> None:
+        if self.conway_generations == 1:
+            self.conway_generations = CONWAY_FAST_FORWARD_GENERATIONS
+        else:
+            self.conway_generations = 1
+            self.cancel_fast_forward()
+
+    def cycle_automaton_rule(self, ctx: AppContext) -> None:
+        index = AUTOMATON_RULES.index(self.automaton_rule)
+        self.automaton_rule = AUTOMATON_RULES[(index + 1) % len(AUTOMATON_RULES)]
+        self.cancel_fast_forward()
+
+    def conway_step(self) -> None:
+        # HashLife only knows Conway's rule, the other rules are stepped one generation at a time
+        if self.conway_generations == 1 or self.automaton_rule != CONWAY_RULE:
+            Effect.play_automaton(self.canvas, self.automaton_rule)
+        elif self.fast_forward is None:
+            # Fast forwarding can take seconds so it runs on a worker process, a tick that
+            # comes while it runs is skipped
+            xs, ys = self.canvas.painted()
+            job = Parallel.submit(
+                Effect.fast_forward_cells, xs, ys, self.conway_generations
+            )
+            self.fast_forward = (job, xs, ys, self.canvas_writes)
+
+    def finish_fast_forward(self) -> None:
+        if self.fast_forward is None or not self.fast_forward[0].done():
+            return
+
+        job, xs, ys, writes = self.fast_forward
+        self.fast_forward = None
+        # The result is a diff against the cells the job started from, so it's only valid if the
+        # canvas wasn't drawn on, cleared or undone meanwhile, the next tick starts over
+        if writes != self.canvas_writes:
+            return
+
+        Effect.write_generation(
+            self.canvas, xs, ys, *job.result(), self.tool_manager.primary_color.value
+        )
+
+    def cancel_fast_forward(self) -> None:
+        """Drops the running fast forward, a worker that already started finishes unused"""
+
+        if self.fast_forward is not None:
+            self.fast_forward[0].cancel()
+            self.fast_forward = None
+
+    def canvas_written(self, canves: Canvas, tiles: set[tuple[int, int]]) -> None:
+        self.canvas_writes += 1
+
     def handle_debugging_input(self) -> None:
         im = self.input_manager
         dbg = self.debugging_tool
@@ -244,7 +325,9 @@ class DrawingCanvas:
         dt = self.delta_time()
         self._fps_timer += dt
         if self._fps_timer >= 0.2:
-            pygame.display.set_caption(f"Drawing Canvas {self.fps():.1f} FPS")
+            pygame.display.set_caption(
+                f"Drawing Canvas {self.fps():.1f} FPS {self.automaton_rule}"
+            )
             self._fps_timer = 0
 
     def update(self) -> None:
@@ -253,6 +336,7 @@ class DrawingCanvas:
         self.input_manager.update()
         self.statusbar.update()
         self.conway_timer.update()
+        self.finish_fast_forward()
         self.tool_manager.update()
         if self.input_manager.keys_new_input():
             self.hotkey_manager.update()
@@ -261,9 +345,12 @@ class DrawingCanvas:
         self.handle_general_input()
         self.update_caption()
 
+        # Everything drawn during the frame (a tool stroke, a conway step, a clear) is undone at once
+        self.history.commit()
+
     def draw(self) -> None:
         self.screen.fill(self.color_table["bg_primary"].rgb)
-        Draw.draw_canvas(self.screen, self.canvas, self.camera, self.color_table)
+        Draw.draw_canvas(self.screen, self.layers, self.camera, self.color_table)
         self.debugging_tool.draw()
         self.statusbar.draw()
         debug(str(type(self.tool_manager.current_tool)))
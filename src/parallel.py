@@ -0,0 +1,165 @@
+import os
+import atexit
+import numpy as np
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from canvas import Canvas
+from static import *
+
+# A kernel gets the pixels of a block with a halo wide border and the block (left, top, right, bottom) rect,
+# and returns the new pixels of the block. Kernels are sent to the workers by name so they have to be
+# module level functions or static methods
+type Kernel = Callable[..., np.ndarray]
+
+
+class SharedBoard:
+    """A source and a target uint32 board in shared memory, the workers read the source and write the target"""
+
+    def __init__(
+        self, shape: tuple[int, int], names: tuple[str, str] | None = None
+    ) -> None:
+        """Creates the boards, or attaches to the existing ones of the given names"""
+
+        self.shape = shape
+        if names is None:
+            size = max(shape[0] * shape[1] * 4, 1)
+            self.blocks = tuple(SharedMemory(create=True, size=size) for _ in range(2))
+        else:
+            self.blocks = tuple(SharedMemory(name) for name in names)
+
+    @property
+    def names(self) -> tuple[str, str]:
+        return (self.blocks[0].name, self.blocks[1].name)
+
+    @property
+    def source(self) -> np.ndarray:
+        return np.ndarray(self.shape, dtype=np.uint32, buffer=self.blocks[0].buf)
+
+    @property
+    def target(self) -> np.ndarray:
+        return np.ndarray(self.shape, dtype=np.uint32, buffer=self.blocks[1].buf)
+
+    def close(self) -> None:
+        for block in self.blocks:
+            block.close()
+
+    def release(self) -> None:
+        """Closes and frees the boards, only by the process that created them"""
+
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+
+
+class Parallel:
+    """
+    Runs kernels over a canvas split into blocks of tiles across a pool of processes.
+
+    The canvas is copied once into a shared source board and every worker writes its blocks into a
+    shared target board, so the pixels are never pickled, only the block rects and the kernel arguments.
+    Since the whole source is read before anything is written, stencil kernels like a Conway step
+    see the same generation in every block.
+    """
+
+    executor: ProcessPoolExecutor | None = None
+    board: SharedBoard | None = None
+
+    # The shared boards the worker process is attached to, by their names
+    attached: tuple[tuple[str, str], SharedBoard] | None = None
+
+    @staticmethod
+    def apply(canves: Canvas, kernel: Kernel, halo: int = 0, *args) -> None:
+        """Replaces the canvas pixels with the kernel result of every block"""
+
+        shape = (canves.h, canves.w)
+        if Parallel.board is None or Parallel.board.shape != shape:
+            if Parallel.board is not None:
+                Parallel.board.release()
+            Parallel.board = SharedBoard(shape)
+
+        board = Parallel.board
+        board.source[:] = canves.region(0, 0, canves.w, canves.h)
+
+        jobs = [
+            Parallel.submit(
+                Parallel.run_block, board.names, shape, rect, halo, kernel, args
+            )
+            for rect in Parallel.blocks(canves.w, canves.h)
+        ]
+        for job in jobs:
+            job.result()  # raises what the worker raised
+
+        canves.set_pixels(board.target)
+
+    @staticmethod
+    def submit(function: Callable, *args) -> Future:
+        """Runs the function on a worker process, it's sent by name like the kernels"""
+
+        if Parallel.executor is None:
+            Parallel.executor = ProcessPoolExecutor(os.cpu_count())
+
+        return Parallel.executor.submit(function, *args)
+
+    @staticmethod
+    def blocks(w: int, h: int) -> list[tuple[int, int, int, int]]:
+        """The (left, top, right, bottom) rects of the blocks of tiles a w by h board is split to"""
+
+        return [
+            (
+                left,
+                top,
+                min(left + PARALLEL_BLOCK_SIZE, w),
+                min(top + PARALLEL_BLOCK_SIZE, h),
+            )
+            for top in range(0, h, PARALLEL_BLOCK_SIZE)
+            for left in range(0, w, PARALLEL_BLOCK_SIZE)
+        ]
+
+    @staticmethod
+    def run_block(
+        names: tuple[str, str],
+        shape: tuple[int, int],
+        rect: tuple[int, int, int, int],
+        halo: int,
+        kernel: Kernel,
+        args: tuple,
+    ) -> None:
+        """Runs in a worker, writes the kernel result of the block with its halo to the target board"""
+
+        if Parallel.attached is None or Parallel.attached[0] != names:
+            if Parallel.attached is not None:
+                Parallel.attached[1].close()
+            Parallel.attached = (names, SharedBoard(shape, names))
+
+        board = Parallel.attached[1]
+        source = board.source
+        h, w = shape
+        left, top, right, bottom = rect
+
+        # The block with a border of its neighbors, pixels outside the board are blank
+        border_left, border_top = max(left - halo, 0), max(top - halo, 0)
+        border_right, border_bottom = min(right + halo, w), min(bottom + halo, h)
+        pixels = source[border_top:border_bottom, border_left:border_right]
+        if halo:
+            pixels = np.pad(
+                pixels,
+                (
+                    (halo - (top - border_top), halo - (border_bottom - bottom)),
+                    (halo - (left - border_left), halo - (border_right - right)),
+                ),
+            )
+
+        board.target[top:bottom, left:right] = kernel(pixels, rect, *args)
+
+    @staticmethod
+    def shutdown() -> None:
+        if Parallel.executor is not None:
+            Parallel.executor.shutdown()
+            Parallel.executor = None
+
+        if Parallel.board is not None:
+            Parallel.board.release()
+            Parallel.board = None
+
+
+atexit.register(Parallel.shutdown)
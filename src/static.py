@@ -9,6 +9,10 @@ type RGB = tuple[int, int, int]
 type RGBA = tuple[int, int, int, int]
 type Key = int
 type Anchor = Literal["nw", "n", "ne", "w", "c", "e", "sw", "s", "se"]
+type BlendMode = Literal["normal", "multiply", "screen", "add"]
+type FillRule = Literal["even-odd", "nonzero"]
+type LineCap = Literal["round", "square"]
+type CurveType = Literal["bezier", "catmull-rom"]
 
 # Constants
 MAX_FPS = 0  # 60
@@ -26,6 +30,21 @@ STATUS_BAR_PADDING_X = 10
 STATUS_BAR_LINES_GAP = 0
 STATUS_BAR_ITEMS_GAP = 20
 UNSHOWING_THE_GRID_THRESHOLD = 5
+CANVAS_TILE_SIZE = 64
+GRID_CACHE_SIZE = 8
+TILE_SURFACE_CACHE_SIZE = 1024
+HISTORY_MEMORY_BUDGET = 64 * 1024 * 1024  # bytes
+HASHLIFE_CACHE_SIZE = 2_000_000  # nodes and memoized results
+CONWAY_FAST_FORWARD_GENERATIONS = 1024
+CONWAY_RULE = "B3/S23"
+AUTOMATON_RULE_CACHE_SIZE = 32
+PARALLEL_BLOCK_SIZE = 4 * CANVAS_TILE_SIZE
+FILTER_BAND_HEIGHT = 4 * CANVAS_TILE_SIZE
+# smaller canvases are cheaper to process on the main process
+PARALLEL_MIN_PIXELS = 1024 * 1024
+BEZIER_TOLERANCE = 0.25  # pixels between a flattened curve and its polyline
+BEZIER_MAX_DEPTH = 16  # halvings of a curve piece
+CURVE_GRAB_RADIUS = 3  # pixels around a control point that grab it
 
 TOOLS = (
     "hand",
@@ -39,6 +58,15 @@ TOOLS = (
     "eraser",
 )
 
+AUTOMATON_RULES = (
+    CONWAY_RULE,
+    "B36/S23",  # HighLife
+    "B3678/S34678",  # Day & Night
+    "B2/S/C3",  # Brian's Brain
+    "B2/S345/C4",  # Star Wars
+    "R5,C0,M1,S34..58,B34..45,NM",  # Bugs
+)
+
 with open("hotkeys.json", "r") as file:
     HOTKEYS: dict[str, list[int]] = load(file)
 
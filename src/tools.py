@@ -1,6 +1,9 @@
+import numpy as np
 from vector import Vector
+from canvas import Canvas
 from app_context import AppContext
 from input_manager import InputManager
+from draw import Draw
 from static import *
 
 
@@ -8,6 +11,14 @@ class Tool:
     def __init__(self) -> None: ...
     def update(self, ctx: AppContext, *args, **kwargs) -> None: ...
 
+    @staticmethod
+    def is_input_taken(im: InputManager) -> bool:
+        """Shift and Alt clicks belong to the debugging tool and space clicks to panning"""
+
+        return (
+            im.is_mod_held("shift") or im.is_mod_held("alt") or im.is_key_held("space")
+        )
+
 
 class Hand(Tool):
     def update(self, ctx: AppContext):
@@ -56,16 +67,132 @@ class Rectangle(Tool):
 class Fill(Tool):
     def __init__(self) -> None:
         self.p: Vector | None = None
+        # replace the color everywhere, not only the area under p
+        self.replace_all: bool = False
+
+    def update(self, ctx: AppContext):
+        im = ctx.input_manager
+
+        if Tool.is_input_taken(im):
+            return
+
+        if im.is_mouse_button_pressed(pygame.BUTTON_LEFT):
+            self.p = ctx.camera.to_local(im.mouse_pos)
+            Draw.fill(
+                ctx.canves,
+                self.p,
+                ctx.tool_manager.primary_color.rgba,
+                self.replace_all or im.is_mod_held("ctrl"),
+            )
 
 
 class Shape(Tool):
     def __init__(self) -> None:
         self.vertices: list[Vector] = []
+        self.rule: FillRule = "even-odd"
+
+    def update(self, ctx: AppContext):
+        im = ctx.input_manager
+
+        if Tool.is_input_taken(im):
+            return
+
+        if im.is_mouse_button_pressed(pygame.BUTTON_LEFT):
+            self.vertices.append(ctx.camera.to_local(im.mouse_pos))
+
+        if im.is_mouse_button_pressed(pygame.BUTTON_RIGHT) and self.vertices:
+            Draw.polygon(
+                ctx.canves,
+                self.vertices,
+                ctx.tool_manager.primary_color.rgba,
+                im.is_mod_held("ctrl"),
+                self.rule,
+            )
+            self.vertices = []
 
 
 class Curve(Tool):
+    """Places the control points of a curve, dragging a point reshapes the curve live."""
+
     def __init__(self) -> None:
-        self.curve_type: str = "bezier"
+        self.curve_type: CurveType = "bezier"
+        self.points: list[Vector] = []
+        self.dragged: int | None = None  # the index of the point being dragged
+        self.preview: Canvas | None = None
+        self.preview_rect: tuple[int, int, int, int] | None = None
+
+    def update(self, ctx: AppContext):
+        im = ctx.input_manager
+
+        if Tool.is_input_taken(im):
+            return
+
+        mouse = ctx.camera.to_local(im.mouse_pos)
+        color = ctx.tool_manager.primary_color.rgba
+
+        if im.is_mouse_button_pressed(pygame.BUTTON_LEFT):
+            self.dragged = self.grab(mouse)
+            if self.dragged is None:
+                self.points.append(mouse)
+                self.dragged = len(self.points) - 1
+            self.draw_preview(ctx, color)
+        elif (
+            self.dragged is not None
+            and im.is_mouse_button_held(pygame.BUTTON_LEFT)
+            and im.is_mouse_moved()
+        ):
+            self.points[self.dragged] = mouse
+            self.draw_preview(ctx, color)
+
+        if im.is_mouse_button_released(pygame.BUTTON_LEFT):
+            self.dragged = None
+
+        if im.is_mouse_button_pressed(pygame.BUTTON_MIDDLE):
+            self.curve_type = "catmull-rom" if self.curve_type == "bezier" else "bezier"
+            if self.points:
+                self.draw_preview(ctx, color)
+
+        if im.is_mouse_button_pressed(pygame.BUTTON_RIGHT) and self.points:
+            points = self.flatten()
+            Draw.flat_curve(ctx.canves, points, color, im.is_mod_held("ctrl"), 1)
+            self.close_preview(ctx)
+            self.points = []
+            self.dragged = None
+
+    def grab(self, pos: Vector) -> int | None:
+        """The index of the last control point within CURVE_GRAB_RADIUS of pos"""
+
+        for index in range(len(self.points) - 1, -1, -1):
+            point = self.points[index]
+            if max(abs(point.x - pos.x), abs(point.y - pos.y)) <= CURVE_GRAB_RADIUS:
+                return index
+
+        return None
+
+    def flatten(self) -> np.ndarray:
+        if self.curve_type == "catmull-rom":
+            return Draw.catmull_rom_points(self.points)
+        return Draw.bezier_points(self.points)
+
+    def draw_preview(self, ctx: AppContext, color: RGBA) -> None:
+        if self.preview is None:
+            self.preview = ctx.layers.add_layer("curve preview")
+        elif self.preview_rect is not None:
+            self.preview.set_rect(*self.preview_rect, (0, 0, 0, 0))
+
+        points = self.flatten()
+        Draw.flat_curve(self.preview, points, color, False, 1)
+
+        (left, top), (right, bottom) = points.min(axis=0), points.max(axis=0) + 1
+        self.preview_rect = (int(left), int(top), int(right), int(bottom))
+
+    def close_preview(self, ctx: AppContext) -> None:
+        if self.preview is not None:
+            canvases = [layer.canves for layer in ctx.layers.layers]
+            ctx.layers.remove_layer(canvases.index(self.preview))
+
+        self.preview = None
+        self.preview_rect = None
 
 
 class Pincil(Tool):